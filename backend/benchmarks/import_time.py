@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Per-module import-time report for the app, measured with `python -X importtime`
+in fresh interpreters, plus a startup budget for CI
+
+Run from the backend directory:
+    python -m benchmarks.import_time                      # top 20 modules by cumulative time
+    python -m benchmarks.import_time --budget-ms 1000     # exit 1 if importing app_clean takes longer
+    python -m benchmarks.import_time --gunicorn           # as a gevent worker imports it (exit 1 if the OpenAI client breaks)
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# What a gunicorn gevent worker runs before it imports the app: the master loads
+# gunicorn.conf.py, then the forked worker monkey-patches the process
+GUNICORN_PRELUDE = "import runpy; runpy.run_path('gunicorn.conf.py'); from gevent import monkey; monkey.patch_all(); "
+# ...and what must still work afterwards: building the OpenAI client (httpx and trio
+# break under the patch when they are first imported after it)
+GUNICORN_CHECK = "; from openai import OpenAI; OpenAI(api_key='import-check', base_url='http://127.0.0.1:9/v1')"
+
+def measure(module, prelude="", check=""):
+    """Import `module` in a fresh interpreter; returns {name: (self_us, cumulative_us, depth)} for it and what it pulled in"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"{prelude}import {module}{check}"],
+                          capture_output=True, text=True, env=env, cwd=os.getcwd())
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+    # a module is reported after everything it imported, so its subtree is the
+    # run of deeper lines just before it (interpreter startup comes earlier)
+    end = next(i for i, row in enumerate(rows) if row[0] == module and row[3] == 0)
+    start = end
+    while start > 0 and rows[start - 1][3] > 0:
+        start -= 1
+    return {name: (self_us, cum_us, depth) for name, self_us, cum_us, depth in rows[start:end + 1]}
+
+def best_of(module, repeat, prelude="", check=""):
+    """Fastest of `repeat` runs per module, so a noisy run doesn't fail the budget"""
+    runs = [measure(module, prelude, check) for _ in range(repeat)]
+    return {name: min((run[name] for run in runs if name in run), key=lambda t: t[1])
+            for name in runs[0]}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app_clean", help="module to import")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters to measure, best run wins")
+    parser.add_argument("--top", type=int, default=20, help="modules to list")
+    parser.add_argument("--depth", type=int, default=1, help="only list modules imported at most this deep")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if importing --module takes longer")
+    parser.add_argument("--output", help="write the full report as JSON")
+    parser.add_argument("--gunicorn", action="store_true",
+                        help="import after gunicorn.conf.py and gevent monkey-patching, then build the OpenAI client")
+    args = parser.parse_args(argv)
+
+    try:
+        modules = best_of(args.module, args.repeat, *((GUNICORN_PRELUDE, GUNICORN_CHECK) if args.gunicorn else ()))
+    except RuntimeError as e:
+        print(e)
+        return 1
+    total_ms = modules[args.module][1] / 1000.0
+    rows = sorted(((name, self_us / 1000.0, cum_us / 1000.0) for name, (self_us, cum_us, depth) in modules.items()
+                   if name != args.module and depth <= args.depth), key=lambda r: -r[2])
+
+    print(f"import {args.module}{' in a gevent worker' if args.gunicorn else ''}: {total_ms:.1f}ms (best of {args.repeat})")
+    print(f"{'module':<40} {'self ms':>10} {'cumulative ms':>14}")
+    for name, self_ms, cum_ms in rows[:args.top]:
+        print(f"{name:<40} {self_ms:>10.1f} {cum_ms:>14.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"module": args.module, "total_ms": total_ms,
+                       "modules": {name: {"self_ms": s / 1000.0, "cumulative_ms": c / 1000.0, "depth": d}
+                                   for name, (s, c, d) in modules.items()}}, f, indent=2)
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Import budget exceeded: {total_ms:.1f}ms > {args.budget_ms:.0f}ms")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the ingest, chunking, labeling and retrieval hot paths
+
+Run from the backend directory:
+    python -m benchmarks.run_benchmarks --sizes 10,100,1000 --output bench.json
+    python -m benchmarks.run_benchmarks --compare bench.json   # exit 1 on regressions
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+from benchmarks.synthetic import make_pages, write_pdf
+
+QUERIES = [
+    "how does gradient descent relate to neural network learning",
+    "what does the research say about climate and energy",
+    "customer market strategy",
+]
+
+def _optional(import_fn):
+    """Import a benchmark target, returning (target, skip_reason)"""
+    try:
+        return import_fn(), None
+    except ImportError as e:
+        return None, f"missing dependency: {e.name}"
+
+def _greedy_chunk():
+    from services.ingest import greedy_chunk
+    return greedy_chunk
+
+def _plan_sections():
+    from services.sections import page_starts, build_section_tree, plan_chunks
+    return lambda pages, text: plan_chunks(text, build_section_tree(text, page_starts(pages)))
+
+def _difficulty_heuristic():
+    from services.labeling import difficulty_heuristic
+    return difficulty_heuristic
+
+def _key_noun_phrases():
+    from services.tasks import SKLEARN_AVAILABLE, _key_noun_phrases
+    if not SKLEARN_AVAILABLE:
+        raise ImportError(name="sklearn")
+    return _key_noun_phrases
+
+def measure(fn, repeat):
+    """Time fn over `repeat` runs, then trace one extra run for peak memory"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return timings, peak
+
+def bench_size(num_pages, repeat):
+    import app_clean
+
+    pages = make_pages(num_pages)
+    text = "\n".join(pages)
+    pdf = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    with pdf:
+        write_pdf(pages, pdf)
+
+    num_chunks = app_clean.calculate_chunks_count(text)
+    chunks = app_clean.create_chunks(text, num_chunks)
+    chunk_texts = [chunk["text"] for chunk in chunks]
+    chunk_rows = [SimpleNamespace(text=chunk_text) for chunk_text in chunk_texts]
+    blocks = [{"page": pno, "text": para}
+              for pno, page in enumerate(pages, start=1)
+              for para in page.split("\n\n") if para.strip()]
+
+    greedy_chunk, greedy_skip = _optional(_greedy_chunk)
+    plan_sections, plan_skip = _optional(_plan_sections)
+    difficulty_heuristic, difficulty_skip = _optional(_difficulty_heuristic)
+    key_noun_phrases, phrases_skip = _optional(_key_noun_phrases)
+
+    cases = [
+        ("extract_pdf_text", lambda: app_clean.extract_pdf_text(pdf.name), None),
+        ("normalize_pages", lambda: app_clean.normalize_pages(pages), None),
+        ("create_chunks", lambda: app_clean.create_chunks(text, num_chunks), None),
+        ("greedy_chunk", lambda: greedy_chunk(blocks), greedy_skip),
+        ("plan_sections", lambda: plan_sections(pages, text), plan_skip),
+        ("difficulty_heuristic", lambda: [difficulty_heuristic(t) for t in chunk_texts], difficulty_skip),
+        ("_key_noun_phrases", lambda: [key_noun_phrases(t) for t in chunk_texts], phrases_skip),
+        ("categorize_topic", lambda: [app_clean.categorize_topic(t) for t in chunk_texts], None),
+        ("find_relevant_chunks", lambda: [app_clean.find_relevant_chunks(q, chunk_rows) for q in QUERIES], None),
+    ]
+
+    results = []
+    try:
+        for name, fn, skip in cases:
+            results.append(_run_case(name, fn, skip, num_pages, text, len(chunks), repeat))
+    finally:
+        os.remove(pdf.name)
+    return results
+
+def _run_case(name, fn, skip, num_pages, text, num_chunks, repeat):
+    entry = {"name": name, "pages": num_pages, "input_chars": len(text), "chunks": num_chunks}
+    if skip:
+        entry["skipped"] = skip
+        print(f"  {name:<22} skipped ({skip})", file=sys.stderr)
+        return entry
+
+    timings, peak = measure(fn, repeat)
+    best = min(timings)
+    entry.update({
+        "seconds_min": round(best, 6),
+        "seconds_median": round(statistics.median(timings), 6),
+        "pages_per_sec": round(num_pages / best, 2) if best else None,
+        "mb_per_sec": round(len(text) / best / 1e6, 3) if best else None,
+        "peak_kb": round(peak / 1024, 1),
+    })
+    print(f"  {name:<22} {best * 1000:10.2f} ms  {entry['pages_per_sec']:>10} pages/s  {entry['peak_kb']:>10} KB peak",
+          file=sys.stderr)
+    return entry
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path, threshold):
+    """Return result names whose best time regressed past threshold x baseline"""
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["pages"]): r for r in json.load(f)["results"] if "seconds_min" in r}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["name"], r["pages"]))
+        if not old or "seconds_min" not in r:
+            continue
+        ratio = r["seconds_min"] / old["seconds_min"] if old["seconds_min"] else 1.0
+        if ratio > threshold:
+            regressions.append(f"{r['name']} @ {r['pages']} pages: {ratio:.2f}x slower")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="comma separated page counts")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON from a previous run")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        print(f"{size} pages", file=sys.stderr)
+        results.extend(bench_size(size, args.repeat))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# benchmarks/synthetic.py
+"""
+Deterministic synthetic corpora and PDFs for benchmarks and load tests
+"""
+import random
+import textwrap
+from typing import List
+
+TOPIC_WORDS = [
+    "algorithm", "network", "learning", "system", "analysis", "research", "market",
+    "strategy", "patient", "treatment", "climate", "energy", "community", "student",
+    "knowledge", "process", "experiment", "software", "customer", "theory",
+]
+FILLER_WORDS = [
+    "the", "a", "of", "to", "and", "in", "that", "is", "for", "with", "as", "on",
+    "by", "this", "which", "are", "from", "an", "be", "can", "these", "between",
+]
+TECH_TERMS = [
+    "Gradient Descent", "Neural Network", "Supply Chain", "Clinical Trial",
+    "Carbon Capture", "Social Network", "Reinforcement Learning", "Market Segmentation",
+]
+
+LINES_PER_PAGE = 48
+CHARS_PER_LINE = 90
+
+def _sentence(rng: random.Random) -> str:
+    words = []
+    for _ in range(rng.randint(10, 24)):
+        roll = rng.random()
+        if roll < 0.25:
+            words.append(rng.choice(TOPIC_WORDS))
+        elif roll < 0.3:
+            words.append(rng.choice(TECH_TERMS))
+        elif roll < 0.35:
+            words.append(str(rng.randint(2, 500)))
+        else:
+            words.append(rng.choice(FILLER_WORDS))
+    sentence = " ".join(words)
+    return sentence[0].upper() + sentence[1:] + rng.choice([".", ".", ".", "?", "!"])
+
+def make_pages(num_pages: int, seed: int = 7) -> List[str]:
+    """Return page texts with a running header, a numbered heading every few
+    pages, prose paragraphs and a page-number footer - like real PyPDF2 output"""
+    rng = random.Random(seed)
+    pages = []
+    for pno in range(1, num_pages + 1):
+        lines = ["Synthetic Handbook of Applied Studies"]
+        if pno % 5 == 1:
+            lines.append(f"{pno // 5 + 1}. {rng.choice(TECH_TERMS)} in Practice")
+        while len(lines) < LINES_PER_PAGE - 1:
+            paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+            lines.extend(textwrap.wrap(paragraph, CHARS_PER_LINE))
+            lines.append("")
+        lines = lines[:LINES_PER_PAGE - 1]
+        lines.append(f"Page {pno}")
+        pages.append("\n".join(lines))
+    return pages
+
+def make_text(num_pages: int, seed: int = 7) -> str:
+    return "\n".join(make_pages(num_pages, seed))
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(pages: List[str], stream) -> None:
+    """Write a minimal text-only PDF (Helvetica, one content stream per page)"""
+    objects = []  # object bodies, numbered from 1
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")  # placeholder, filled once the page tree exists
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for page in pages:
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in page.split("\n"):
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        content = "\n".join(ops).encode("latin-1", "replace")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids).encode()
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_at)
+    stream.write(bytes(out))
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Bulk-ingest a library of PDFs with the same extraction, chunking and labeling
+as /api/upload. PDFs are parsed in worker processes; the main process writes
+the rows and commits every --batch-size documents.
+
+Run from the backend directory:
+    python bulk_ingest.py courses/ml/                  # every *.pdf below the directory
+    python bulk_ingest.py --manifest pdfs.txt -j 8      # one path per line
+
+Each committed batch is appended to the --checkpoint file (JSON lines), so a
+rerun after a crash skips documents that are already in the database. A PDF
+whose sha256 is already stored (a crash between commit and checkpoint, or the
+same file under two paths) is checkpointed against the existing document
+instead of being stored again.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from sqlalchemy import func
+
+from app_clean import prepare_document, store_document
+from db import SessionLocal, engine, add_missing_columns, add_missing_indexes
+from models import Base, Doc
+from services import pdf_store
+
+def find_pdfs(paths, manifest=None):
+    """Expand directories and a manifest file into a sorted list of PDF paths"""
+    if manifest:
+        with open(manifest) as f:
+            paths = list(paths) + [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    found = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.update(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        else:
+            found.add(path)
+    return sorted(os.path.abspath(path) for path in found)
+
+def load_checkpoint(path):
+    """Paths already ingested by earlier runs"""
+    done = set()
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["path"])
+                except (ValueError, KeyError):
+                    continue  # A torn last line from a killed run
+    return done
+
+def prepare_file(path):
+    """Worker: read, hash, retain and prepare one PDF"""
+    with open(path, "rb") as f:
+        data = f.read()
+    prepared = prepare_document(io.BytesIO(data))
+    prepared["path"] = path
+    prepared["file_size"] = len(data)
+    prepared["sha256"] = hashlib.sha256(data).hexdigest()
+    prepared["storage_path"] = pdf_store.put_bytes(data, prepared["sha256"])
+    return prepared
+
+def stored_documents(db, hashes):
+    """Document id already stored for each of these sha256 hashes"""
+    sha256 = func.json_extract(Doc.meta_json, "$.sha256")
+    return {digest: doc_id for doc_id, digest in db.query(Doc.id, sha256).filter(sha256.in_(hashes))}
+
+def commit_batch(batch, checkpoint):
+    """Store a batch of prepared documents in one transaction, then checkpoint them
+    
+    Returns a checkpoint row per document; "stored" is False for one whose
+    sha256 was already in the database.
+    """
+    db = SessionLocal()
+    try:
+        known = stored_documents(db, {prepared["sha256"] for prepared in batch})
+        rows = []
+        for prepared in batch:
+            doc_id = known.get(prepared["sha256"])
+            if doc_id is None:
+                filename = os.path.basename(prepared["path"])
+                doc_id = known[prepared["sha256"]] = store_document(db, filename, prepared, meta={
+                    'original_filename': filename,
+                    'file_size': prepared["file_size"],
+                    'sha256': prepared["sha256"]
+                }, storage_path=prepared["storage_path"]).id
+                rows.append({"path": prepared["path"], "sha256": prepared["sha256"], "doc_id": doc_id, "stored": True})
+            else:
+                rows.append({"path": prepared["path"], "sha256": prepared["sha256"], "doc_id": doc_id, "stored": False})
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if checkpoint:
+        with open(checkpoint, "a") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="PDF files or directories to scan for them")
+    parser.add_argument("--manifest", help="file listing PDF paths, one per line")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="parser processes")
+    parser.add_argument("--batch-size", type=int, default=20, help="documents per commit")
+    parser.add_argument("--checkpoint", default=".bulk_ingest.jsonl", help="resume file ('' to disable)")
+    args = parser.parse_args(argv)
+
+    pdfs = find_pdfs(args.paths, args.manifest)
+    if not pdfs:
+        parser.error("no PDFs found")
+    done = load_checkpoint(args.checkpoint)
+    todo = [path for path in pdfs if path not in done]
+    print(f"{len(pdfs)} PDFs, {len(pdfs) - len(todo)} already ingested, {len(todo)} to go with {args.workers} workers")
+
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(Base.metadata)
+    add_missing_indexes(Base.metadata)
+
+    start = time.perf_counter()
+    docs = pages = chars_removed = duplicates = 0
+    failed = []
+    batch = []
+    # Only this many PDFs are parsed ahead of the writer; each result is let go once committed
+    window = max(1, args.workers) * 2
+    queue = iter(todo)
+    submitted = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        pending = {}
+        while True:
+            for path in islice(queue, window - len(pending)):
+                pending[pool.submit(prepare_file, path)] = path
+                submitted += 1
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = pending.pop(future)
+                try:
+                    batch.append(future.result())
+                except Exception as e:
+                    failed.append(path)
+                    print(f"  failed {path}: {e}")
+            if len(batch) >= args.batch_size or (batch and not pending and submitted == len(todo)):
+                rows = commit_batch(batch, args.checkpoint)
+                for prepared, row in zip(batch, rows):
+                    if row["stored"]:
+                        docs += 1
+                        pages += prepared["page_count"]
+                        chars_removed += prepared["normalization"]["chars_removed"]
+                    else:
+                        duplicates += 1
+                print(f"  {docs + duplicates}/{len(todo)} documents committed")
+                batch = []
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"Ingested {docs} documents ({pages} pages) in {elapsed:.1f}s: "
+          f"{docs / elapsed * 60:.1f} docs/min, {pages / elapsed:.1f} pages/sec")
+    if duplicates:
+        print(f"{duplicates} were already stored under the same sha256 and were not stored again")
+    print(f"Normalization removed {chars_removed} characters (~{chars_removed // 4} tokens) of headers, footers and whitespace")
+    if failed:
+        print(f"{len(failed)} failed and will be retried on the next run")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,8 @@
 # db.py
 import os
 from flask import current_app
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, scoped_session
 
 def get_db_uri():
@@ -9,5 +10,39 @@ def get_db_uri():
     os.makedirs("instance", exist_ok=True)
     return "sqlite:///instance/gamify.db"
 
-engine = create_engine(get_db_uri(), echo=False, future=True)
+engine = create_engine(
+    get_db_uri(),
+    echo=False,
+    future=True,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+)
 SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False))
+
+def add_missing_columns(metadata):
+    """create_all never alters existing tables - add columns new models introduced"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {col.type.compile(engine.dialect)}'
+                if col.default is not None and col.default.is_scalar:
+                    default = col.default.arg
+                    ddl += f" DEFAULT {int(default) if isinstance(default, bool) else repr(default)}"
+                conn.execute(text(ddl))
+
+def add_missing_indexes(metadata):
+    """create_all skips indexes on tables that already existed - create the ones models added since"""
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with engine.begin() as conn:
+                    index.create(conn, checkfirst=True)
+            except IntegrityError:
+                # rows written before a unique index existed collide; leave them and run without it
+                print(f"WARNING: {index.name} not created - {table.name} has duplicate rows")
@@ -0,0 +1,56 @@
+# gunicorn.conf.py
+"""
+Production server settings - run with: gunicorn -c gunicorn.conf.py wsgi:app
+
+Hurdle and query requests spend nearly all their time waiting on OpenAI, so
+workers use gevent: every blocking socket call yields, and one worker holds
+thousands of in-flight LLM requests instead of one per OS thread.
+"""
+import multiprocessing
+import os
+
+# gevent workers monkey-patch the process before they load the app, and the patch
+# removes select.epoll. httpx, under the OpenAI SDK, imports trio when it is
+# installed, and trio needs epoll - so import httpx here, in the master, before any
+# patching; forked workers inherit it.
+import httpx  # noqa: F401
+
+bind = os.getenv("BIND", "0.0.0.0:5002")
+
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", min(4, multiprocessing.cpu_count())))
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", "2000"))
+
+# Seconds to hold idle client connections open between requests
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# A worker silent for this long is killed; must exceed the slowest LLM call
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+
+# On SIGTERM, workers stop accepting and get this long to finish in-flight requests
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = "-"
+errorlog = "-"
+
+# Each worker builds its own app: background threads and SQLite connections
+# must not be shared across fork
+preload_app = False
+
+def post_worker_init(worker):
+    # With OPENAI_API_KEY set, a worker that cannot build the OpenAI client would
+    # quietly serve local questions only - refuse to boot instead (gunicorn halts)
+    if not os.getenv("OPENAI_API_KEY"):
+        return
+    from app_clean import get_openai_client
+    if get_openai_client() is None:
+        worker.log.error("OPENAI_API_KEY is set but the OpenAI client failed to initialize in this worker")
+        raise RuntimeError("OpenAI client unavailable")
+
+def worker_exit(server, worker):
+    from app_clean import shutdown_background_work
+    shutdown_background_work()
@@ -1,25 +1,36 @@
 # llm/chains.py
 import os, json
 from typing import List, Dict
-from langchain_openai import ChatOpenAI
-from .prompts import SEGMENT_PROMPT, BOSS_PROMPT
+from services.llm_scheduler import scheduler, estimate_tokens
+
+# LangChain costs seconds to import, so it is only loaded when a chain runs
 
 def _llm():
+    from langchain_openai import ChatOpenAI
     return ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
 
+def _invoke(llm, prompt: str) -> str:
+    # background work: queue behind interactive calls and share the rate limit
+    with scheduler.slot("background", estimate_tokens([{"content": prompt}], 1024)) as ticket:
+        msg = llm.invoke(prompt)
+        ticket.tokens = (getattr(msg, "usage_metadata", None) or {}).get("total_tokens")
+    return msg.content
+
 def refine_segments(raw_text: str) -> List[Dict]:
+    from .prompts import SEGMENT_PROMPT
     llm = _llm()
     prompt = SEGMENT_PROMPT.format(raw=raw_text)
-    out = llm.invoke(prompt).content
+    out = _invoke(llm, prompt)
     try:
         return json.loads(out)
     except Exception:
         return [{"text": raw_text, "cognitive_load": 3, "rationale": "fallback"}]
 
 def make_boss_questions(chunks_text: List[str]) -> List[Dict]:
+    from .prompts import BOSS_PROMPT
     llm = _llm()
     prompt = BOSS_PROMPT.format(chunks="\n\n".join(chunks_text[:6]))
-    out = llm.invoke(prompt).content
+    out = _invoke(llm, prompt)
     try:
         return json.loads(out)
     except Exception:
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+End-to-end load generator for the upload -> hurdle -> submit -> query loop
+
+Each simulated learner registers, then walks the shared documents: fetch a
+hurdle, think, answer (right with --accuracy probability, else wrong or skip)
+and ask a document question every --query-every steps. Latency percentiles
+are reported per endpoint.
+
+    python -m loadtest.driver --base-url http://localhost:5002 --learners 200 --steps 30
+
+With --fake-openai pointing at loadtest.fake_openai, the run fails unless the
+backend actually sent it completions; otherwise the numbers would only measure
+the local fallbacks.
+"""
+import argparse
+import io
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+
+from benchmarks.synthetic import make_pages, write_pdf
+
+QUERIES = [
+    "What is the main idea of this section?",
+    "How does the algorithm relate to learning?",
+    "What does the research say about energy?",
+]
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, status, seconds):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def summary(self, elapsed):
+        rows = []
+        for endpoint in sorted(self.latencies):
+            samples = sorted(self.latencies[endpoint])
+            statuses = dict(self.statuses[endpoint])
+            rows.append({
+                "endpoint": endpoint,
+                "count": len(samples),
+                "rps": round(len(samples) / elapsed, 2) if elapsed else None,
+                "p50_ms": round(_percentile(samples, 50) * 1000, 1),
+                "p95_ms": round(_percentile(samples, 95) * 1000, 1),
+                "p99_ms": round(_percentile(samples, 99) * 1000, 1),
+                "max_ms": round(samples[-1] * 1000, 1),
+                "errors": sum(n for status, n in statuses.items() if status == 0 or status >= 500),
+                "statuses": statuses,
+            })
+        return rows
+
+def _percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+def fake_openai_completions(url, timeout=10):
+    """Completions served so far by a loadtest.fake_openai server (its /v1 URL or its root)"""
+    root = url.rstrip("/")
+    root = root[:-3] if root.endswith("/v1") else root
+    with urllib.request.urlopen(root + "/stats", timeout=timeout) as resp:
+        return json.loads(resp.read())["completions"]
+
+class Client:
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.timeout = timeout
+        self.token = None
+
+    def request(self, endpoint, method, path, body=None, content_type="application/json"):
+        headers = {}
+        if body is not None and content_type == "application/json":
+            body = json.dumps(body).encode()
+        if body is not None:
+            headers["Content-Type"] = content_type
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+
+        start = time.perf_counter()
+        status, data = 0, None
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                status, data = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, data = e.code, e.read()
+        except (urllib.error.URLError, OSError):
+            pass
+        self.recorder.record(endpoint, status, time.perf_counter() - start)
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    def upload(self, filename, pdf_bytes):
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            "Content-Type: application/pdf\r\n\r\n"
+        ).encode() + pdf_bytes + f"\r\n--{boundary}--\r\n".encode()
+        return self.request("POST /api/upload", "POST", "/api/upload", body,
+                            content_type=f"multipart/form-data; boundary={boundary}")
+
+def learner(args, doc_ids, recorder, rng):
+    client = Client(args.base_url, recorder, args.timeout)
+    handle = f"load-{uuid.uuid4().hex[:12]}"
+    status, data = client.request("POST /api/auth/register", "POST", "/api/auth/register",
+                                  {"handle": handle, "email": f"{handle}@example.com", "password": "load-test-pw"})
+    if status == 201 and data:
+        client.token = data["access_token"]
+
+    doc_id = rng.choice(doc_ids)
+    for step in range(1, args.steps + 1):
+        status, hurdle = client.request("GET /api/hurdle", "GET", f"/api/hurdle/{doc_id}")
+        if status != 200 or not hurdle:
+            continue
+        if hurdle.get("done"):
+            doc_id = rng.choice(doc_ids)
+            continue
+
+        time.sleep(rng.uniform(0, args.think_ms) / 1000.0)
+        task = hurdle.get("task") or {}
+        roll = rng.random()
+        if roll < args.skip_rate:
+            body = {"skip": True}
+        elif roll < args.skip_rate + args.accuracy:
+            body = {"answer": task.get("correct", 0)}
+        else:
+            body = {"answer": (task.get("correct", 0) + 1) % max(1, len(task.get("options") or [1]))}
+        body.update({"task_id": hurdle.get("task_id"), "time_ms": rng.randint(1000, 20000)})
+        client.request("POST /api/hurdle", "POST", f"/api/hurdle/{doc_id}", body)
+
+        if args.query_every and step % args.query_every == 0:
+            client.request("POST /api/query", "POST", f"/api/query/{doc_id}", {"query": rng.choice(QUERIES)})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:5002")
+    parser.add_argument("--learners", type=int, default=200, help="concurrent simulated learners")
+    parser.add_argument("--steps", type=int, default=20, help="hurdles each learner attempts")
+    parser.add_argument("--docs", type=int, default=3, help="synthetic documents to upload and share")
+    parser.add_argument("--pages", type=int, default=30, help="pages per synthetic document")
+    parser.add_argument("--pdf", action="append", help="upload this PDF instead of synthetic ones (repeatable)")
+    parser.add_argument("--accuracy", type=float, default=0.7, help="probability a learner answers correctly")
+    parser.add_argument("--skip-rate", type=float, default=0.05)
+    parser.add_argument("--think-ms", type=float, default=500, help="max pause between hurdle and answer")
+    parser.add_argument("--query-every", type=int, default=5, help="ask a document question every N steps (0 = never)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON summary here")
+    parser.add_argument("--fake-openai", help="URL of the loadtest.fake_openai server the backend uses; "
+                                              "the run fails if it served no completions")
+    args = parser.parse_args(argv)
+    completions_before = fake_openai_completions(args.fake_openai) if args.fake_openai else 0
+
+    recorder = Recorder()
+    uploader = Client(args.base_url, recorder, args.timeout)
+    if args.pdf:
+        sources = [(path.rsplit("/", 1)[-1], open(path, "rb").read()) for path in args.pdf]
+    else:
+        sources = []
+        for i in range(args.docs):
+            buf = io.BytesIO()
+            write_pdf(make_pages(args.pages, seed=args.seed + i), buf)
+            sources.append((f"synthetic-{i}.pdf", buf.getvalue()))
+
+    doc_ids = []
+    for filename, pdf_bytes in sources:
+        status, data = uploader.upload(filename, pdf_bytes)
+        if status != 200 or not data:
+            print(f"Upload of {filename} failed with status {status}: {data}", file=sys.stderr)
+            return 1
+        doc_ids.append(data["pdf_id"])
+
+    master = random.Random(args.seed)
+    threads = [
+        threading.Thread(target=learner, args=(args, doc_ids, recorder, random.Random(master.random())), daemon=True)
+        for _ in range(args.learners)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    rows = recorder.summary(elapsed)
+    print(f"\n{args.learners} learners x {args.steps} steps in {elapsed:.1f}s\n")
+    print(f"{'endpoint':<26}{'count':>7}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for r in rows:
+        print(f"{r['endpoint']:<26}{r['count']:>7}{r['rps']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['max_ms']:>10}{r['errors']:>8}")
+    completions = None
+    if args.fake_openai:
+        time.sleep(1)  # background question generation lags the last answers
+        completions = fake_openai_completions(args.fake_openai) - completions_before
+        print(f"\nFake OpenAI served {completions} completions")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"learners": args.learners, "steps": args.steps, "elapsed_s": round(elapsed, 2),
+                       "llm_completions": completions, "endpoints": rows}, f, indent=2)
+    if completions == 0:
+        print("No LLM calls reached the fake OpenAI server - these numbers do not measure the LLM path",
+              file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
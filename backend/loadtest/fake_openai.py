@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat-completions endpoint, for load testing
+
+Returns schema-valid JSON for the prompts app_clean sends, after a
+configurable delay, and fails a configurable share of requests. GET /stats
+reports how many completions were served, so a load test can prove the LLM
+path was exercised.
+
+    python -m loadtest.fake_openai --port 8089 --latency-ms 800 --jitter-ms 400 --error-rate 0.02
+    OPENAI_BASE_URL=http://localhost:8089/v1 OPENAI_API_KEY=fake python app_clean.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def _question(n):
+    return {
+        "type": "choice",
+        "question": f"Why does the passage emphasize concept {n}?",
+        "options": [
+            "Because it explains the main relationship described",
+            "Because it is mentioned only in passing",
+            "Because it contradicts the rest of the text",
+            "Because it is unrelated background",
+        ],
+        "correct": 0,
+        "explanation": "The passage builds its argument around this relationship.",
+        "hint": "Look at how the ideas in the passage connect.",
+    }
+
+def fake_completion(prompt):
+    """Pick a response shape from the prompt the backend sent"""
+    if '"explanation": "brief explanation' in prompt:
+        return json.dumps({"explanation": "The correct option restates the passage directly."})
+    batch = re.search(r"Create (\d+) distinct", prompt)
+    if batch:
+        return json.dumps([_question(random.randint(1, 1000)) for _ in range(int(batch.group(1)))])
+    if "multiple choice question" in prompt:
+        return json.dumps(_question(random.randint(1, 1000)))
+    return "The document explains this directly. It gives supporting details and examples. See the relevant section for context."
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None  # set by serve()
+    stats = {"completions": 0, "failures": 0}
+    stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def log_message(self, fmt, *args):
+        if self.config.verbose:
+            super().log_message(fmt, *args)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.stats_lock:
+                self._send(200, dict(self.stats))
+        else:
+            self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+
+        cfg = self.config
+        delay = max(0.0, cfg.latency_ms + random.uniform(-cfg.jitter_ms, cfg.jitter_ms)) / 1000.0
+        time.sleep(delay)
+
+        if random.random() < cfg.error_rate:
+            status = 429 if random.random() < cfg.rate_limit_share else 500
+            self._count("failures")
+            self._send(status, {"error": {"message": "Injected failure", "type": "server_error"}})
+            return
+
+        prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []))
+        content = fake_completion(prompt)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        self._count("completions")
+        self._send(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # many learners connect at once
+
+def serve(config):
+    FakeOpenAIHandler.config = config
+    return FakeOpenAIServer((config.host, config.port), FakeOpenAIHandler)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=800, help="mean response delay")
+    parser.add_argument("--jitter-ms", type=float, default=300, help="uniform +/- jitter around the mean")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument("--rate-limit-share", type=float, default=0.5, help="share of failures returned as 429 (rest 500)")
+    parser.add_argument("--verbose", action="store_true")
+    config = parser.parse_args(argv)
+
+    server = serve(config)
+    print(f"Fake OpenAI listening on http://{config.host}:{config.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
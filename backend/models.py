@@ -1,6 +1,6 @@
 # models.py
-from datetime import datetime
-from sqlalchemy import String, Integer, Text, JSON, Boolean, ForeignKey, DateTime
+from datetime import date, datetime
+from sqlalchemy import String, Integer, Float, Text, JSON, Boolean, ForeignKey, Date, DateTime, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from typing import Optional
 
@@ -24,8 +24,24 @@ class Doc(Base):
     source_type: Mapped[str] = mapped_column(String(32))  # pdf|url|...
     storage_path: Mapped[str] = mapped_column(String(1024))
     meta_json: Mapped[dict] = mapped_column(JSON, default={})
+    text_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # TextBlob with the extracted text chunk offsets point into
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     chunks: Mapped[list["Chunk"]] = relationship(back_populates="doc", cascade="all, delete-orphan")
+    sections: Mapped[list["Section"]] = relationship(back_populates="doc", cascade="all, delete-orphan")
+
+class Section(Base):
+    __tablename__ = "section"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    doc_id: Mapped[int] = mapped_column(ForeignKey("doc.id"), index=True)
+    parent_id: Mapped[Optional[int]] = mapped_column(ForeignKey("section.id"), nullable=True)
+    idx: Mapped[int] = mapped_column(Integer)  # Pre-order position in the tree
+    level: Mapped[int] = mapped_column(Integer, default=1)
+    title: Mapped[str] = mapped_column(String(255))
+    start_offset: Mapped[int] = mapped_column(Integer)
+    end_offset: Mapped[int] = mapped_column(Integer)
+    page_start: Mapped[int] = mapped_column(Integer, default=1)
+    page_end: Mapped[int] = mapped_column(Integer, default=1)
+    doc: Mapped[Doc] = relationship(back_populates="sections")
 
 class Chunk(Base):
     __tablename__ = "chunk"
@@ -33,14 +49,32 @@ class Chunk(Base):
     doc_id: Mapped[int] = mapped_column(ForeignKey("doc.id"))
     idx: Mapped[int] = mapped_column(Integer)
     section: Mapped[Optional[str]] = mapped_column(String(255), default=None)
-    text: Mapped[str] = mapped_column(Text)
+    section_id: Mapped[Optional[int]] = mapped_column(ForeignKey("section.id"), nullable=True)
+    text: Mapped[str] = mapped_column(Text, default="", deferred=True)  # Inline body of chunks stored before offsets
+    start_offset: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Span in the Doc.text_hash blob
+    end_offset: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    materialized: Mapped[bool] = mapped_column(Boolean, default=True)  # Text cut and labeled
     span_json: Mapped[dict] = mapped_column(JSON, default={})  # page ranges/bboxes
     features_json: Mapped[dict] = mapped_column(JSON, default={})
     difficulty: Mapped[str] = mapped_column(String(1), default="M")  # E/M/H
-    hash: Mapped[str] = mapped_column(String(64))
+    hash: Mapped[str] = mapped_column(String(64))  # md5 of the body once materialized
+    minhash: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True, deferred=True)  # services.neardup signature
+    near_dup_of: Mapped[Optional[int]] = mapped_column(ForeignKey("chunk.id"), nullable=True)  # Chunk whose labels/questions are shared
     doc: Mapped[Doc] = relationship(back_populates="chunks")
     tasks: Mapped[list["Task"]] = relationship(back_populates="chunk", cascade="all, delete-orphan")
 
+class TextBlob(Base):
+    __tablename__ = "text_blob"
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # md5 of the text
+    data: Mapped[bytes] = mapped_column(LargeBinary)  # zlib-compressed UTF-8
+    size: Mapped[int] = mapped_column(Integer)  # Uncompressed bytes
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class ChunkBand(Base):
+    __tablename__ = "chunk_band"
+    band_key: Mapped[str] = mapped_column(String(16), primary_key=True)  # "<band>:<crc32 of its rows>"
+    chunk_id: Mapped[int] = mapped_column(ForeignKey("chunk.id"), primary_key=True)
+
 class Task(Base):
     __tablename__ = "task"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -50,7 +84,12 @@ class Task(Base):
     payload_json: Mapped[dict] = mapped_column(JSON)
     difficulty: Mapped[str] = mapped_column(String(1), default="M")
     source: Mapped[str] = mapped_column(String(16), default="auto")
+    position: Mapped[int] = mapped_column(Integer, default=0)  # Question slot within the chunk
     chunk: Mapped[Chunk] = relationship(back_populates="tasks")
+    __table_args__ = (
+        # one question per slot and source; writers insert-or-ignore against it
+        Index("ux_task_slot", "chunk_id", "type", "position", "source", unique=True),
+    )
 
 class Attempt(Base):
     __tablename__ = "attempt"
@@ -63,6 +102,41 @@ class Attempt(Base):
     is_skip: Mapped[bool] = mapped_column(Boolean, default=False)
     confidence: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_attempt_user_task", "user_id", "task_id"),  # per-learner stats
+        Index("ix_attempt_created", "created_at"),  # retention scans the oldest rows
+    )
+
+class AttemptRollup(Base):
+    # one learner's attempts on one document in one day, once the raw rows age out (services/retention.py)
+    __tablename__ = "attempt_rollup"
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("app_user.id"), primary_key=True)
+    doc_id: Mapped[int] = mapped_column(ForeignKey("doc.id"), primary_key=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    correct: Mapped[int] = mapped_column(Integer, default=0)
+    skipped: Mapped[int] = mapped_column(Integer, default=0)
+    timed: Mapped[int] = mapped_column(Integer, default=0)  # attempts with time_ms > 0
+    time_ms: Mapped[int] = mapped_column(Integer, default=0)  # summed over the timed ones
+    __table_args__ = (Index("ix_attempt_rollup_learner", "user_id", "doc_id"),)
+
+class AttemptKey(Base):
+    # client idempotency key of a batched answer, so a retried batch records it once
+    __tablename__ = "attempt_key"
+    user_id: Mapped[int] = mapped_column(ForeignKey("app_user.id"), primary_key=True)
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    attempt_id: Mapped[int] = mapped_column(ForeignKey("attempt.id"))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class AwardedTask(Base):
+    # the attempt that earned points for a question; one per learner and question, so
+    # resubmits and concurrent submits can't score it again
+    __tablename__ = "awarded_task"
+    user_id: Mapped[int] = mapped_column(ForeignKey("app_user.id"), primary_key=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("task.id"), primary_key=True)
+    attempt_id: Mapped[Optional[int]] = mapped_column(ForeignKey("attempt.id"), nullable=True)
+    points: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 class Progress(Base):
     __tablename__ = "progress"
@@ -72,4 +146,50 @@ class Progress(Base):
     current_chunk_question: Mapped[int] = mapped_column(Integer, default=0)  # Current question within chunk (0-2)
     questions_per_chunk: Mapped[int] = mapped_column(Integer, default=1)  # Number of questions per chunk
     hearts: Mapped[int] = mapped_column(Integer, default=5)
+    bosses_cleared: Mapped[int] = mapped_column(Integer, default=0)  # Boss fights won, in roadmap order
+    reviews_since_chunk: Mapped[int] = mapped_column(Integer, default=0)  # Due reviews served since the last new chunk
+    xp: Mapped[int] = mapped_column(Integer, default=0)  # Points from services.scoring, added per attempt
+    streak: Mapped[int] = mapped_column(Integer, default=0)  # Correct answers in a row
+    best_streak: Mapped[int] = mapped_column(Integer, default=0)
+    served_task_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # Question last handed out by GET /api/hurdle
+    served_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # When it was first handed out, to time answers
+    version: Mapped[int] = mapped_column(Integer, default=0)  # Bumped on every compare-and-swap update
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ReviewItem(Base):
+    __tablename__ = "review_item"
+    __table_args__ = (
+        UniqueConstraint("user_id", "task_id"),
+        Index("ix_review_item_due", "user_id", "doc_id", "due_at"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("app_user.id"))
+    doc_id: Mapped[int] = mapped_column(ForeignKey("doc.id"))
+    task_id: Mapped[int] = mapped_column(ForeignKey("task.id"))
+    ease: Mapped[float] = mapped_column(Float, default=2.5)  # SM-2 easiness factor
+    interval_days: Mapped[float] = mapped_column(Float, default=0.0)
+    repetitions: Mapped[int] = mapped_column(Integer, default=0)  # Correct reviews in a row
+    lapses: Mapped[int] = mapped_column(Integer, default=0)
+    due_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_reviewed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class LeaderboardEntry(Base):
+    __tablename__ = "leaderboard"
+    __table_args__ = (Index("ix_leaderboard_rank", "board", "xp"),)
+    board: Mapped[str] = mapped_column(String(32), primary_key=True)  # "global" or "doc:<id>"
+    user_id: Mapped[int] = mapped_column(ForeignKey("app_user.id"), primary_key=True)
+    xp: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class LlmCall(Base):
+    __tablename__ = "llm_call"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    site: Mapped[str] = mapped_column(String(64), index=True)  # generate_question|validate_answer|query_document|...
+    model: Mapped[str] = mapped_column(String(64))
+    doc_id: Mapped[Optional[int]] = mapped_column(ForeignKey("doc.id"), nullable=True, index=True)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    latency_ms: Mapped[int] = mapped_column(Integer, default=0)
+    outcome: Mapped[str] = mapped_column(String(16))  # success|parse_failure|fallback|circuit_open
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,62 @@
+# services/blobs.py
+"""
+Content-addressed, zlib-compressed text store for extracted document text.
+Identical texts are stored once under their md5, and decompressed texts are
+kept in a bounded LRU so a document is not inflated for every chunk sliced
+from it.
+"""
+import hashlib, os, threading, zlib
+from collections import OrderedDict
+from typing import Dict, Iterable
+from sqlalchemy.dialects.sqlite import insert
+from models import TextBlob
+
+CACHE_CHARS = int(os.getenv("BLOB_CACHE_MB", "64")) * 1024 * 1024
+
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_chars = 0
+_lock = threading.Lock()
+
+def text_hash(text: str) -> str:
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+def _remember(key: str, text: str):
+    global _cache_chars
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return
+        _cache[key] = text
+        _cache_chars += len(text)
+        while _cache_chars > CACHE_CHARS and len(_cache) > 1:
+            _, old = _cache.popitem(last=False)
+            _cache_chars -= len(old)
+
+def put_text(db, text: str) -> str:
+    # store text once under its hash and return the hash; the caller commits
+    key = text_hash(text)
+    raw = text.encode("utf-8")
+    db.execute(insert(TextBlob).values(hash=key, data=zlib.compress(raw, 6), size=len(raw))
+               .on_conflict_do_nothing(index_elements=["hash"]))
+    _remember(key, text)
+    return key
+
+def get_texts(db, keys: Iterable[str]) -> Dict[str, str]:
+    found, missing = {}, []
+    with _lock:
+        for key in set(k for k in keys if k):
+            if key in _cache:
+                _cache.move_to_end(key)
+                found[key] = _cache[key]
+            else:
+                missing.append(key)
+    for i in range(0, len(missing), 500):  # stay under sqlite's bound parameter limit
+        rows = db.query(TextBlob.hash, TextBlob.data).filter(TextBlob.hash.in_(missing[i:i + 500])).all()
+        for key, data in rows:
+            text = zlib.decompress(data).decode("utf-8")
+            found[key] = text
+            _remember(key, text)
+    return found
+
+def get_text(db, key: str) -> str:
+    return get_texts(db, [key]).get(key, "") if key else ""
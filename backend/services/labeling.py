@@ -1,5 +1,4 @@
 # services/labeling.py
-from textstat import flesch_kincaid_grade
 import re, math
 from typing import Dict
 
@@ -15,6 +14,7 @@ def _entity_like(text: str) -> int:
     return len(re.findall(r"\b[A-Z][a-zA-Z]+\b", text))
 
 def difficulty_heuristic(text: str) -> Dict:
+    from textstat import flesch_kincaid_grade  # slow to import, so not at module load
     fk = flesch_kincaid_grade(text or "a.")
     jr = _jargon_ratio(text)
     en = _entity_like(text)
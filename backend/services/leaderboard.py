@@ -0,0 +1,201 @@
+# services/leaderboard.py
+"""
+XP, streaks and leaderboards, updated once per attempt. A question scores
+once per learner, for their first correct answer (awarded_task), and only a
+scoring answer extends the streak; a wrong one still ends it. Every
+learner has a row per document board and on the global board; top-K reads walk the
+(board, xp) index, and "my rank" counts higher scores in a per-board sparse
+Fenwick tree, so neither query touches raw attempts.
+"""
+import threading, time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert as sql_insert
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+from models import Attempt, AwardedTask, LeaderboardEntry, Progress, Task, User
+from services.progress import compare_and_set
+from services.scoring import score_attempt
+
+GLOBAL = "global"
+
+def doc_board(doc_id: int) -> str:
+    return f"doc:{doc_id}"
+
+class _ScoreCounts:
+    # sparse Fenwick tree counting entries per xp value; 32 steps per operation
+    SIZE = 1 << 32
+
+    def __init__(self):
+        self.tree: Dict[int, int] = {}
+        self.total = 0
+
+    def add(self, xp: int, delta: int):
+        self.total += delta
+        i = min(max(xp, 0), self.SIZE - 2) + 1
+        while i < self.SIZE:
+            self.tree[i] = self.tree.get(i, 0) + delta
+            i += i & -i
+
+    def at_most(self, xp: int) -> int:
+        i, n = min(max(xp, 0), self.SIZE - 2) + 1, 0
+        while i > 0:
+            n += self.tree.get(i, 0)
+            i -= i & -i
+        return n
+
+class RankIndex:
+    # per-board score counts, loaded from the table on first use and reloaded every
+    # reload_seconds so ranks catch up with awards made by other worker processes
+    def __init__(self, max_boards: int = 1000, reload_seconds: float = 300.0):
+        self._boards: "OrderedDict[str, Tuple[float, _ScoreCounts]]" = OrderedDict()
+        self._max_boards = max_boards
+        self._reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+
+    def _load(self, db, board: str) -> _ScoreCounts:
+        entry = self._boards.get(board)
+        if entry is None or time.monotonic() - entry[0] >= self._reload_seconds:
+            counts = _ScoreCounts()
+            for (xp,) in db.query(LeaderboardEntry.xp).filter(LeaderboardEntry.board == board):
+                counts.add(xp, 1)
+            entry = self._boards[board] = (time.monotonic(), counts)
+        self._boards.move_to_end(board)
+        while len(self._boards) > self._max_boards:
+            self._boards.popitem(last=False)
+        return entry[1]
+
+    def moved(self, board: str, old_xp: Optional[int], new_xp: int, since: float):
+        # apply a committed award; a board loaded after `since` already includes it
+        with self._lock:
+            entry = self._boards.get(board)
+            if entry is None or entry[0] >= since:
+                return
+            if old_xp is not None:
+                entry[1].add(old_xp, -1)
+            entry[1].add(new_xp, 1)
+
+    def rank(self, db, board: str, xp: int) -> int:
+        # 1 + number of learners with more xp (ties share a rank)
+        with self._lock:
+            counts = self._load(db, board)
+            return 1 + counts.total - counts.at_most(xp)
+
+rank_index = RankIndex()
+
+def add_points(db, user_id: int, doc_id: int, points: int) -> List[Tuple[str, Optional[int], int]]:
+    # upsert the learner's document and global board rows without committing; returns
+    # the (board, old_xp, new_xp) moves to hand rank_index once the caller commits
+    now = datetime.utcnow()
+    moves = []
+    for board in (doc_board(doc_id), GLOBAL):
+        new_xp = db.execute(
+            insert(LeaderboardEntry)
+            .values(board=board, user_id=user_id, xp=points, updated_at=now)
+            .on_conflict_do_update(index_elements=["board", "user_id"],
+                                   set_={"xp": LeaderboardEntry.xp + points, "updated_at": now})
+            .returning(LeaderboardEntry.xp)
+        ).scalar_one()
+        moves.append((board, new_xp - points if new_xp != points else None, new_xp))
+    return moves
+
+def claim_award(db, user_id: int, task_id: int, attempt_id: Optional[int], points: int) -> bool:
+    # record that this question has scored for the learner, without committing; False if it
+    # already had. The primary key settles concurrent claims when the loser flushes or commits
+    if db.get(AwardedTask, (user_id, task_id)) is not None:
+        return False
+    db.add(AwardedTask(user_id=user_id, task_id=task_id, attempt_id=attempt_id, points=points))
+    db.flush()
+    return True
+
+def award_attempt(db, progress: Progress, task_id: int, attempt_id: Optional[int], correct: bool,
+                  elapsed_ms: Optional[int], is_skip: bool = False) -> int:
+    # for the first correct answer to a question, add its points to xp and the leaderboards
+    # and extend the streak in one transaction; a wrong answer or skip ends the streak, and
+    # a question that already scored changes nothing. Returns the points. Retries like the
+    # other progress updates.
+    while True:
+        since = time.monotonic()
+        combo = progress.streak or 0
+        correct = correct and not is_skip
+        points = score_attempt(correct, elapsed_ms, combo)
+        streak = combo + 1 if correct else 0
+        moves = []
+        try:
+            if points:
+                if not claim_award(db, progress.user_id, task_id, attempt_id, points):
+                    return 0  # scored before, or a concurrent submit of this answer won the claim
+                moves = add_points(db, progress.user_id, progress.doc_id, points)
+            if compare_and_set(db, progress, xp=Progress.xp + points, streak=streak,
+                               best_streak=max(progress.best_streak or 0, streak)):
+                break
+        except IntegrityError:
+            db.rollback()  # a concurrent submit claimed this question first
+        db.refresh(progress)  # The leaderboard upserts were rolled back with it
+    for board, old_xp, new_xp in moves:
+        rank_index.moved(board, old_xp, new_xp, since)
+    return points
+
+def top(db, board: str, limit: int = 10) -> List[Dict]:
+    # highest xp first, straight off the (board, xp) index
+    rows = (db.query(LeaderboardEntry.user_id, LeaderboardEntry.xp, User.handle)
+            .join(User, User.id == LeaderboardEntry.user_id)
+            .filter(LeaderboardEntry.board == board)
+            .order_by(LeaderboardEntry.xp.desc(), LeaderboardEntry.user_id)
+            .limit(limit).all())
+    entries = []
+    for i, row in enumerate(rows):
+        rank = entries[-1]["rank"] if entries and entries[-1]["xp"] == row.xp else i + 1
+        entries.append({"rank": rank, "user_id": row.user_id, "handle": row.handle, "xp": row.xp})
+    return entries
+
+def my_rank(db, board: str, user_id: int) -> Dict:
+    entry = db.get(LeaderboardEntry, (board, user_id))
+    if entry is None:
+        return {"rank": None, "xp": 0}
+    return {"rank": rank_index.rank(db, board, entry.xp), "xp": entry.xp}
+
+def backfill_leaderboards(db, batch_size: int = 1000) -> int:
+    # replay attempt history into xp, streaks and boards; only runs while the table is empty
+    if db.query(LeaderboardEntry.board).first() is not None:
+        return 0
+    learners: Dict[Tuple[int, int], Dict] = {}
+    awards: Dict[Tuple[int, int], Dict] = {}
+    rows = (db.query(Attempt.id, Attempt.user_id, Attempt.task_id, Attempt.correct, Attempt.is_skip, Task.doc_id)
+            .join(Task, Task.id == Attempt.task_id)
+            .filter(Attempt.user_id.isnot(None))
+            .order_by(Attempt.created_at, Attempt.id)
+            .yield_per(batch_size))
+    for r in rows:
+        state = learners.setdefault((r.user_id, r.doc_id), {"xp": 0, "streak": 0, "best_streak": 0})
+        correct = r.correct and not r.is_skip
+        if correct and (r.user_id, r.task_id) in awards:
+            continue  # already scored, so neither xp nor the streak move
+        # Past answer times were client-reported, so history scores without the speed bonus
+        if correct:
+            points = score_attempt(True, None, state["streak"])
+            awards[(r.user_id, r.task_id)] = {"user_id": r.user_id, "task_id": r.task_id, "attempt_id": r.id,
+                                              "points": points, "created_at": datetime.utcnow()}
+            state["xp"] += points
+        state["streak"] = state["streak"] + 1 if correct else 0
+        state["best_streak"] = max(state["best_streak"], state["streak"])
+    if not learners:
+        return 0
+
+    now = datetime.utcnow()
+    totals: Dict[int, int] = {}
+    entries = []
+    for (user_id, doc_id), state in learners.items():
+        db.query(Progress).filter_by(user_id=user_id, doc_id=doc_id).update(state)
+        if state["xp"]:
+            entries.append({"board": doc_board(doc_id), "user_id": user_id, "xp": state["xp"], "updated_at": now})
+            totals[user_id] = totals.get(user_id, 0) + state["xp"]
+    entries += [{"board": GLOBAL, "user_id": user_id, "xp": xp, "updated_at": now} for user_id, xp in totals.items()]
+    for i in range(0, len(entries), batch_size):
+        db.execute(sql_insert(LeaderboardEntry), entries[i:i + batch_size])
+    awarded = list(awards.values())
+    for i in range(0, len(awarded), batch_size):
+        db.execute(sql_insert(AwardedTask), awarded[i:i + batch_size])
+    db.commit()
+    return len(learners)
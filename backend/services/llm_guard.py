@@ -0,0 +1,114 @@
+# services/llm_guard.py
+"""
+Keeps a degraded LLM API from dragging request latency down with it. A
+circuit breaker stops calling the API after consecutive failures and lets
+one probe through now and then until it recovers; hedged calls give an
+endpoint a latency budget, after which the caller serves its local fallback
+while the LLM call finishes in the background and is cached for next time.
+"""
+import os, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Hashable, Optional, Tuple
+from services import metrics
+
+STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+class CircuitOpenError(Exception):
+    """The breaker is open; callers fall back without calling the API"""
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+        )
+
+    def _set(self, state: str):
+        if state != self.state:
+            print(f"LLM circuit breaker: {self.state} -> {state}")
+        self.state = state
+        metrics.set_gauge("llm_circuit_state", STATES[state])
+
+    def allow(self) -> bool:
+        # closed: always; open: refuse until reset_seconds pass, then admit a single
+        # probe (half-open) whose outcome closes or re-opens the circuit
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._set("half_open")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._set("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set("open")
+
+class HedgedCalls:
+    # run a call under a latency budget. One that overruns keeps running and its
+    # result is cached under `key`, so the next request for it is answered at once;
+    # concurrent requests for the same key share the in-flight call
+    def __init__(self, max_workers: int = 32, max_entries: int = 1000, ttl_seconds: float = 3600.0):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._results: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._pending = {}
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+
+    def _store(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._results[key] = (time.monotonic(), future.result())
+            self._results.move_to_end(key)
+            while len(self._results) > self._max_entries:
+                self._results.popitem(last=False)
+
+    def call(self, key: Hashable, budget_seconds: float, fn: Callable[[], Any], site: str = "") -> Tuple[bool, Optional[Any]]:
+        # (True, result) within budget or from cache; (False, None) once the budget
+        # expires. Exceptions from fn propagate so the caller can fall back
+        endpoint = metrics.current_endpoint()
+        def run():
+            metrics.bind_endpoint(endpoint)  # keep stage timings on the caller's endpoint
+            return fn()
+
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self._ttl:
+                self._results.move_to_end(key)
+                metrics.inc("llm_hedge_total", site=site, outcome="cached")
+                return True, cached[1]
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self._executor.submit(run)
+                future.add_done_callback(lambda f: self._store(key, f))
+        try:
+            result = future.result(timeout=budget_seconds)
+        except FutureTimeout:
+            metrics.inc("llm_hedge_total", site=site, outcome="budget_expired")
+            return False, None
+        metrics.inc("llm_hedge_total", site=site, outcome="in_budget")
+        return True, result
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,121 @@
+# services/llm_ledger.py
+"""
+Buffered ledger of LLM calls. Calls are appended in memory and written to
+the llm_call table in batches so the request path never waits on an insert.
+"""
+import threading, time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import insert
+from models import LlmCall
+
+# USD per 1K tokens as (prompt, completion)
+PRICES_PER_1K = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+}
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = PRICES_PER_1K.get(model, (0.0, 0.0))
+    return prompt_tokens / 1000.0 * prompt_price + completion_tokens / 1000.0 * completion_price
+
+class LlmLedger:
+    def __init__(self, session_factory, batch_size: int = 50, flush_interval: float = 5.0):
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._buffer: List[Dict] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, site: str, model: str, outcome: str, latency_ms: int,
+               prompt_tokens: int = 0, completion_tokens: int = 0, doc_id: Optional[int] = None):
+        row = {"site": site, "model": model, "outcome": outcome, "latency_ms": latency_ms,
+               "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+               "doc_id": doc_id, "created_at": datetime.utcnow()}
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self._batch_size
+        if self._thread is None:
+            self._start()
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        db = self._session_factory()
+        try:
+            db.execute(insert(LlmCall), rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Dropping {len(rows)} LLM ledger rows: {e}")
+            return 0
+        finally:
+            db.close()
+        return len(rows)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="llm-ledger", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self.flush()
+
+def _percentile(sorted_values: List[int], pct: float) -> int:
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(round((len(sorted_values) - 1) * pct / 100.0)))]
+
+def _summarize(rows) -> Dict:
+    latencies = sorted(r.latency_ms for r in rows)
+    outcomes: Dict[str, int] = {}
+    for r in rows:
+        outcomes[r.outcome] = outcomes.get(r.outcome, 0) + 1
+    prompt_tokens = sum(r.prompt_tokens for r in rows)
+    completion_tokens = sum(r.completion_tokens for r in rows)
+    return {
+        "calls": len(rows),
+        "outcomes": outcomes,
+        "p50_latency_ms": _percentile(latencies, 50),
+        "p95_latency_ms": _percentile(latencies, 95),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost_usd": round(sum(call_cost(r.model, r.prompt_tokens, r.completion_tokens) for r in rows), 6),
+    }
+
+def usage_summary(db, since_hours: float = 24 * 7) -> Dict:
+    since = datetime.utcnow() - timedelta(hours=since_hours)
+    rows = db.query(
+        LlmCall.site, LlmCall.doc_id, LlmCall.model, LlmCall.outcome,
+        LlmCall.latency_ms, LlmCall.prompt_tokens, LlmCall.completion_tokens,
+    ).filter(LlmCall.created_at >= since).all()
+    by_site: Dict[str, list] = {}
+    by_doc: Dict[Optional[int], list] = {}
+    for r in rows:
+        by_site.setdefault(r.site, []).append(r)
+        by_doc.setdefault(r.doc_id, []).append(r)
+    return {
+        "since": since.isoformat(),
+        "total": _summarize(rows),
+        "by_site": {site: _summarize(site_rows) for site, site_rows in sorted(by_site.items())},
+        "by_doc": [dict(doc_id=doc_id, **_summarize(doc_rows))
+                   for doc_id, doc_rows in sorted(by_doc.items(), key=lambda kv: -len(kv[1]))],
+    }
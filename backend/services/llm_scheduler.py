@@ -0,0 +1,120 @@
+# services/llm_scheduler.py
+"""
+Central gate for LLM calls. A caller waits for a free slot in its priority
+class and for requests/tokens-per-minute budget before calling the API, and
+interactive work always goes ahead of queued background work.
+"""
+import os, threading, time
+from collections import deque
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, Optional
+from services import metrics
+
+PRIORITIES = {"interactive": 0, "background": 1}  # lower goes first
+
+class TokenBucket:
+    # refills continuously up to one minute's allowance; per_minute <= 0 means unlimited
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+        amount = min(amount, self.capacity)  # an oversized call waits for a full bucket
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self.level -= amount  # may go negative after a settle; later calls wait it out
+
+class LlmScheduler:
+    def __init__(self, caps: Dict[str, int], rpm: float = 0, tpm: float = 0):
+        self._caps = dict(caps)
+        self._inflight = {cls: 0 for cls in caps}
+        self._waiting = {cls: deque() for cls in caps}
+        self._cond = threading.Condition()
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            caps={
+                "interactive": int(os.getenv("LLM_INTERACTIVE_CONCURRENCY", "16")),
+                "background": int(os.getenv("LLM_BACKGROUND_CONCURRENCY", "4")),
+            },
+            rpm=float(os.getenv("LLM_RPM", "0")),
+            tpm=float(os.getenv("LLM_TPM", "0")),
+        )
+
+    def _admit_delay(self, priority: str, ticket, est_tokens: int) -> Optional[float]:
+        # 0 = go now, >0 = our turn but wait for budget, None = wait for a release
+        for cls in sorted(self._caps, key=PRIORITIES.get):
+            if self._waiting[cls] and self._inflight[cls] < self._caps[cls]:
+                break
+        else:
+            return None
+        if cls != priority or self._waiting[cls][0] is not ticket:
+            return None
+        return max(self._requests.wait_time(1), self._tokens.wait_time(est_tokens))
+
+    def _publish(self):
+        for cls in self._caps:
+            metrics.set_gauge("llm_queue_depth", len(self._waiting[cls]), priority=cls)
+            metrics.set_gauge("llm_inflight", self._inflight[cls], priority=cls)
+
+    def acquire(self, priority: str, est_tokens: int = 0):
+        if priority not in self._caps:
+            raise ValueError(f"Unknown LLM priority class: {priority}")
+        ticket = object()
+        start = time.perf_counter()
+        with self._cond:
+            queue = self._waiting[priority]
+            queue.append(ticket)
+            self._publish()
+            try:
+                while True:
+                    delay = self._admit_delay(priority, ticket, est_tokens)
+                    if delay == 0:
+                        break
+                    self._cond.wait(delay)
+            finally:
+                queue.remove(ticket)
+                self._cond.notify_all()
+            self._requests.take(1)
+            self._tokens.take(est_tokens)
+            self._inflight[priority] += 1
+            self._publish()
+        metrics.observe("llm_queue_wait_seconds", time.perf_counter() - start, priority=priority)
+
+    def release(self, priority: str, est_tokens: int = 0, actual_tokens: Optional[int] = None):
+        with self._cond:
+            self._inflight[priority] -= 1
+            if actual_tokens is not None:
+                # charge what the call really used instead of the estimate
+                self._tokens.take(actual_tokens - est_tokens)
+            self._publish()
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: str = "interactive", est_tokens: int = 0):
+        # set `.tokens` on the yielded ticket to settle the estimate with real usage
+        self.acquire(priority, est_tokens)
+        ticket = SimpleNamespace(tokens=None)
+        try:
+            yield ticket
+        finally:
+            self.release(priority, est_tokens, ticket.tokens)
+
+def estimate_tokens(messages, max_tokens: int = 256) -> int:
+    # ~4 characters per token for the prompt, plus the completion allowance
+    return sum(len(m.get("content") or "") for m in messages) // 4 + max_tokens
+
+scheduler = LlmScheduler.from_env()
@@ -0,0 +1,135 @@
+# services/metrics.py
+"""
+In-process counters, gauges and latency histograms rendered in the
+Prometheus text format. Each gunicorn worker keeps its own registry.
+"""
+import threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_meta: Dict[str, Tuple[str, str]] = {}           # name -> (type, help)
+_counters: Dict[Tuple[str, tuple], float] = {}   # (name, labels) -> value
+_gauges: Dict[Tuple[str, tuple], float] = {}
+_histograms: Dict[Tuple[str, tuple], list] = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+_context = threading.local()  # request-scoped labels, see bind_endpoint
+
+def describe(name: str, kind: str, help_text: str):
+    _meta[name] = (kind, help_text)
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, amount: float = 1.0, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + amount
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name: str, seconds: float, **labels):
+    key = _key(name, labels)
+    idx = bisect_left(DEFAULT_BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(DEFAULT_BUCKETS) + 2)
+        if idx < len(DEFAULT_BUCKETS):
+            hist[idx] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+def bind_endpoint(endpoint: str):
+    # label stage timings on this thread with the endpoint being served
+    _context.endpoint = endpoint
+
+def current_endpoint() -> str:
+    return getattr(_context, "endpoint", None) or "background"
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_duration_seconds", time.perf_counter() - start, stage=stage, endpoint=current_endpoint())
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _header(lines: list, name: str, default_kind: str, seen: set):
+    if name in seen:
+        return
+    seen.add(name)
+    kind, help_text = _meta.get(name, (default_kind, name))
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+def render() -> str:
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+    lines, seen = [], set()
+    for (name, labels), value in counters:
+        _header(lines, name, "counter", seen)
+        lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+    for (name, labels), value in gauges:
+        _header(lines, name, "gauge", seen)
+        lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+    for (name, labels), hist in histograms:
+        _header(lines, name, "histogram", seen)
+        cumulative = 0
+        for bound, count in zip(DEFAULT_BUCKETS, hist):
+            cumulative += count
+            le = 'le="%g"' % bound
+            lines.append(f"{name}_bucket{_fmt_labels(labels, le)} {cumulative}")
+        inf = 'le="+Inf"'
+        lines.append(f"{name}_bucket{_fmt_labels(labels, inf)} {hist[-1]}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {hist[-2]:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # the start rides on the statement's own execution context, so a statement that
+    # raises (no after event) can't leave a stale start for the next one to pop
+    context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    observe("stage_duration_seconds", time.perf_counter() - start, stage="db", endpoint=current_endpoint())
+
+def instrument_engine(engine):
+    # time every SQL statement as the "db" stage
+    from sqlalchemy import event
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+describe("http_requests_total", "counter", "HTTP requests by endpoint, method and status")
+describe("http_request_duration_seconds", "histogram", "HTTP request latency by endpoint")
+describe("stage_duration_seconds", "histogram", "Time spent per stage (db, llm, pdf_extract, normalize, chunking, pdf_render, pack_build, json) by endpoint")
+describe("llm_calls_total", "counter", "OpenAI chat completion calls by call site and outcome")
+describe("llm_queue_depth", "gauge", "LLM calls waiting in the scheduler by priority class")
+describe("llm_inflight", "gauge", "LLM calls in flight by priority class")
+describe("llm_queue_wait_seconds", "histogram", "Time LLM calls waited in the scheduler by priority class")
+describe("near_duplicate_reuse_total", "counter", "Chunks that reused a near-duplicate's labels or questions instead of computing them")
+describe("llm_circuit_state", "gauge", "LLM circuit breaker state: 0 closed, 1 half-open (probing), 2 open")
+describe("llm_hedge_total", "counter", "Latency-budgeted LLM calls by call site: in_budget, budget_expired (fallback served) or cached")
+describe("attempt_batch_answers_total", "counter", "Answers in batched submits: applied, duplicate (key already recorded), stale or invalid")
+describe("attempts_rolled_up_total", "counter", "Raw attempts rolled into daily attempt_rollup rows and deleted by retention")
+describe("normalized_chars_removed_total", "counter", "Characters of running headers/footers, page numbers, hyphenation and whitespace removed before chunking")
@@ -0,0 +1,82 @@
+# services/neardup.py
+"""
+MinHash signatures over word shingles, with an LSH band index, to find
+chunks that are nearly the same text - a revised edition, a reflowed PDF,
+notes with a different header. Such chunks can share labels and questions
+instead of paying for them again.
+"""
+import os, random, re, zlib
+from array import array
+from functools import lru_cache
+from importlib.util import find_spec
+from typing import List, Optional
+from sqlalchemy.dialects.sqlite import insert
+from models import Chunk, ChunkBand
+
+NUMPY_AVAILABLE = find_spec("numpy") is not None  # imported on first signature
+
+NUM_PERM = 128
+BANDS, ROWS = 16, 8  # BANDS * ROWS == NUM_PERM; pairs above ~0.7 Jaccard usually share a band
+SHINGLE_WORDS = 5
+THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+MAX_CANDIDATES = 50
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5eed)  # fixed, so signatures agree across processes and restarts
+_A = [_rng.randrange(1, 1 << 32) for _ in range(NUM_PERM)]
+_B = [_rng.randrange(0, 1 << 32) for _ in range(NUM_PERM)]
+
+@lru_cache(maxsize=1)
+def _numpy_params():
+    import numpy as np
+    return np, np.array(_A, dtype=np.uint64), np.array(_B, dtype=np.uint64)
+
+WORD_RE = re.compile(r"\w+")
+
+def shingles(text: str) -> List[int]:
+    # crc32 of each run of SHINGLE_WORDS lowercased words; whitespace and case don't matter
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        words = words + [""] * (SHINGLE_WORDS - len(words))
+    return list({zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+                 for i in range(len(words) - SHINGLE_WORDS + 1)})
+
+def signature(text: str) -> bytes:
+    # NUM_PERM minimum hashes, packed as uint32
+    values = shingles(text)
+    if NUMPY_AVAILABLE:
+        np, a, b = _numpy_params()
+        x = np.array(values, dtype=np.uint64)[:, None]
+        hashed = ((x * a + b) % _PRIME) & 0xFFFFFFFF
+        return hashed.min(axis=0).astype(np.uint32).tobytes()
+    sig = array("I", (min(((a * x + b) % _PRIME) & 0xFFFFFFFF for x in values) for a, b in zip(_A, _B)))
+    return sig.tobytes()
+
+def similarity(sig_a: bytes, sig_b: bytes) -> float:
+    # fraction of matching minimums estimates the shingle Jaccard similarity
+    a, b = array("I", sig_a), array("I", sig_b)
+    return sum(x == y for x, y in zip(a, b)) / float(NUM_PERM)
+
+def band_keys(sig: bytes) -> List[str]:
+    width = ROWS * 4
+    return [f"{band}:{zlib.crc32(sig[band * width:(band + 1) * width]):08x}" for band in range(BANDS)]
+
+def find_near_duplicate(db, sig: bytes, exclude_chunk_id: Optional[int] = None,
+                        threshold: float = THRESHOLD) -> Optional[Chunk]:
+    # most similar indexed chunk at or above threshold, via chunks sharing any band
+    candidate_ids = [row.chunk_id for row in db.query(ChunkBand.chunk_id)
+                     .filter(ChunkBand.band_key.in_(band_keys(sig)))
+                     .distinct().limit(MAX_CANDIDATES)]
+    best, best_score = None, threshold
+    for chunk in db.query(Chunk).filter(Chunk.id.in_(candidate_ids), Chunk.id != exclude_chunk_id):
+        if chunk.minhash is None:
+            continue
+        score = similarity(sig, chunk.minhash)
+        if score >= best_score:
+            best, best_score = chunk, score
+    return best
+
+def index_chunk(db, chunk_id: int, sig: bytes):
+    # add a chunk's bands to the LSH index, skipping bands already there; the caller commits
+    db.execute(insert(ChunkBand).on_conflict_do_nothing(),
+               [{"band_key": key, "chunk_id": chunk_id} for key in band_keys(sig)])
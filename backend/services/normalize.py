@@ -0,0 +1,119 @@
+# services/normalize.py
+"""
+Cleans PyPDF2 page text before sections and chunks are planned: running
+headers/footers and page numbers (lines repeated at the same edge of several
+pages), ligatures and invisible characters, words hyphenated across line
+breaks (compounds keep their hyphen), and runs of whitespace. Works page by page, so page offsets and the
+outline's page numbers stay valid.
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+EDGE_LINES = 2  # lines at the top and bottom of a page that may be a header/footer
+MIN_PAGES = 3  # an edge line is boilerplate once it repeats on this many pages
+MAX_BOILERPLATE_CHARS = 120
+
+LIGATURES = str.maketrans({
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl", "\ufb05": "st", "\ufb06": "st",
+    "\u00a0": " ", "\u2009": " ", "\u202f": " ",  # no-break and thin spaces
+    "\u00ad": None, "\u200b": None, "\u200c": None, "\u200d": None, "\ufeff": None,  # soft hyphen, zero-width
+})
+ROMAN_RE = re.compile(r"\b[ivxlc]+\b")
+DIGITS_RE = re.compile(r"\d+")
+HYPHEN_BREAK_RE = re.compile(r"(\w+)-[ \t]*\n[ \t]*(\w+)")
+WORD_RE = re.compile(r"\w+(?:-\w+)*")
+# second halves of common compounds, for documents too short to use the word on its own
+COMPOUND_TAILS = frozenset({
+    "known", "based", "free", "level", "scale", "specific", "related", "oriented", "driven",
+    "defined", "friendly", "aware", "wide", "term",
+})
+SPACES_RE = re.compile(r"[ \t\r\f\v]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+def fingerprint(line: str) -> str:
+    # "Page 12 of 300" and "Page 13 of 300" (or "xii") share a fingerprint
+    line = " ".join(line.lower().split())
+    return DIGITS_RE.sub("#", ROMAN_RE.sub("#", line) if len(line) <= 8 else line)
+
+def _edges(lines: List[str]) -> Tuple[List[str], List[str]]:
+    body = [line for line in lines if line.strip()]
+    return body[:EDGE_LINES], body[-EDGE_LINES:]
+
+def find_boilerplate(pages: List[List[str]]) -> Tuple[Set[str], Set[str]]:
+    # fingerprints of lines seen at the top, and at the bottom, of at least MIN_PAGES pages
+    top, bottom = Counter(), Counter()
+    for lines in pages:
+        head, foot = _edges(lines)
+        top.update({fingerprint(line) for line in head if len(line.strip()) <= MAX_BOILERPLATE_CHARS})
+        bottom.update({fingerprint(line) for line in foot if len(line.strip()) <= MAX_BOILERPLATE_CHARS})
+    return ({fp for fp, n in top.items() if n >= MIN_PAGES},
+            {fp for fp, n in bottom.items() if n >= MIN_PAGES})
+
+def _strip_edges(lines: List[str], top: Set[str], bottom: Set[str]) -> Tuple[List[str], int]:
+    # drop boilerplate lines among the first and last EDGE_LINES non-blank lines
+    keep = list(lines)
+    removed = 0
+    for edge, order in ((top, range(len(keep))), (bottom, range(len(keep) - 1, -1, -1))):
+        seen = 0
+        for i in order:
+            if not keep[i].strip():
+                continue
+            if seen == EDGE_LINES:
+                break
+            seen += 1
+            if fingerprint(keep[i]) in edge:
+                keep[i] = ""
+                removed += 1
+    return keep, removed
+
+def vocabulary(pages: List[str]) -> Set[str]:
+    # lowercased words the document spells whole, including hyphenated compounds and
+    # their parts, but not the fragments of words broken across a line
+    words = set(COMPOUND_TAILS)
+    for page in pages:
+        for word in WORD_RE.findall(HYPHEN_BREAK_RE.sub(" ", page).lower()):
+            words.add(word)
+            words.update(word.split("-"))
+    return words
+
+def dehyphenate(text: str, words: Set[str]) -> Tuple[str, int]:
+    # rejoin a word hyphenated across a line break when the joined word is known, or when
+    # the second part starts lowercase and isn't a word itself ("infor-\nmation"); else it
+    # is a compound, which keeps its hyphen ("well-\nknown" -> "well-known"). Returns the
+    # text and the number of joins
+    joins = 0
+    def repair(m):
+        nonlocal joins
+        left, right = m.group(1), m.group(2)
+        if (left + right).lower() in words or (right[0].islower() and right.lower() not in words):
+            joins += 1
+            return left + right
+        return f"{left}-{right}"
+    return HYPHEN_BREAK_RE.sub(repair, text), joins
+
+def normalize_pages(pages: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    # cleaned pages, and a report of what was removed (tokens at ~4 characters each,
+    # like services.llm_scheduler.estimate_tokens)
+    split = [page.translate(LIGATURES).split("\n") for page in pages]
+    top, bottom = find_boilerplate(split)
+    words = vocabulary(["\n".join(lines) for lines in split])
+    cleaned = []
+    boilerplate = dehyphenated = 0
+    for lines in split:
+        lines, removed = _strip_edges(lines, top, bottom)
+        boilerplate += removed
+        page, joins = dehyphenate("\n".join(lines), words)
+        dehyphenated += joins
+        page = "\n".join(SPACES_RE.sub(" ", line).strip() for line in page.split("\n"))
+        cleaned.append(BLANK_LINES_RE.sub("\n\n", page).strip())
+
+    before = sum(len(page) for page in pages)
+    after = sum(len(page) for page in cleaned)
+    return cleaned, {
+        "chars_before": before,
+        "chars_removed": before - after,
+        "tokens_removed": (before - after) // 4,
+        "boilerplate_lines": boilerplate,
+        "dehyphenated": dehyphenated,
+    }
@@ -0,0 +1,102 @@
+# services/pdf_store.py
+"""
+Content-addressed store for source PDFs (instance/pdfs/<ab>/<sha256>.pdf)
+and a size-bounded disk LRU for the PNG pages rendered from them.
+"""
+import os, shutil, tempfile, threading
+from typing import Optional
+
+STORE_DIR = os.getenv("PDF_STORE_DIR", os.path.join("instance", "pdfs"))
+
+def pdf_path(sha256: str) -> str:
+    return os.path.join(STORE_DIR, sha256[:2], f"{sha256}.pdf")
+
+def _atomic_write(path: str, write):
+    # write to a temp file beside the target and rename, so readers never see a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def put_stream(stream, sha256: str) -> str:
+    # keep a PDF once under its sha256; returns the stored path
+    path = pdf_path(sha256)
+    if not os.path.exists(path):
+        stream.seek(0)
+        _atomic_write(path, lambda f: shutil.copyfileobj(stream, f, 1024 * 1024))
+    return path
+
+def put_bytes(data: bytes, sha256: str) -> str:
+    path = pdf_path(sha256)
+    if not os.path.exists(path):
+        _atomic_write(path, lambda f: f.write(data))
+    return path
+
+class DiskLRU:
+    # files under `root` evicted oldest-access-first once they pass max_bytes. The
+    # size is tracked in memory after one scan; other workers' writes are picked
+    # up on the next rescan, which every eviction does
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _scan(self):
+        entries = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue  # evicted by another worker
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mtime is the recency mark (atime is often disabled)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)  # overwriting a key frees the old file's bytes
+        except FileNotFoundError:
+            replaced = 0
+        _atomic_write(path, lambda f: f.write(data))
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += len(data) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # drop least recently used files down to 90% of the budget
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
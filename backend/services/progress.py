@@ -0,0 +1,108 @@
+# services/progress.py
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from models import Progress
+
+def get_or_create_progress(db, user_id: int, doc_id: int, **defaults) -> Progress:
+    progress = db.query(Progress).filter_by(user_id=user_id, doc_id=doc_id).first()
+    if progress:
+        return progress
+    progress = Progress(user_id=user_id, doc_id=doc_id, cleared=0, version=0, **defaults)
+    db.add(progress)
+    try:
+        db.commit()
+    except IntegrityError:
+        # another request created the row first
+        db.rollback()
+        progress = db.query(Progress).filter_by(user_id=user_id, doc_id=doc_id).one()
+    return progress
+
+def compare_and_set(db, progress: Progress, **values) -> bool:
+    # optimistic update: only applies if nobody bumped the version since we read it.
+    # values may be SQL expressions (e.g. Progress.cleared + 1)
+    res = db.execute(
+        update(Progress)
+        .where(Progress.user_id == progress.user_id,
+               Progress.doc_id == progress.doc_id,
+               Progress.version == progress.version)
+        .values(version=Progress.version + 1, updated_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount != 1:
+        db.rollback()
+        return False
+    db.commit()
+    db.refresh(progress)
+    return True
+
+def mark_served(db, progress: Progress, task_id: int):
+    # remember the question handed out and when it first was, so answers are timed on the
+    # server; fetching it again doesn't restart the clock. Not a move, so no version bump
+    if progress.served_task_id == task_id:
+        return
+    now = datetime.utcnow()
+    db.execute(
+        update(Progress)
+        .where(Progress.user_id == progress.user_id, Progress.doc_id == progress.doc_id)
+        .values(served_task_id=task_id, served_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    progress.served_task_id, progress.served_at = task_id, now
+
+def answer_elapsed_ms(progress: Progress, task_id: int, now: Optional[datetime] = None) -> Optional[int]:
+    # time since the question was served, or None when it wasn't the one served
+    if progress.served_task_id != task_id or progress.served_at is None:
+        return None
+    return int(((now or datetime.utcnow()) - progress.served_at).total_seconds() * 1000)
+
+def advance_chunk(db, progress: Progress, from_cleared: int) -> bool:
+    # move past chunk `from_cleared`; a concurrent submit that already moved
+    # past it wins and we report False instead of double counting
+    while progress.cleared == from_cleared:
+        if compare_and_set(db, progress, cleared=from_cleared + 1, current_chunk_question=0):
+            return True
+        db.refresh(progress)
+    return False
+
+def question_advance(questions_per_chunk: int, from_cleared: int, from_question: int) -> dict:
+    # the progress values after answering question `from_question` of chunk `from_cleared`
+    if from_question + 1 >= (questions_per_chunk or 1):
+        return {"cleared": from_cleared + 1, "current_chunk_question": 0, "reviews_since_chunk": 0}
+    return {"current_chunk_question": from_question + 1}
+
+def boss_advance(from_boss: int, from_question: int, questions: int) -> dict:
+    # the progress values after answering question `from_question` of boss fight `from_boss`
+    if from_question + 1 >= questions:
+        return {"bosses_cleared": from_boss + 1, "current_chunk_question": 0, "reviews_since_chunk": 0}
+    return {"current_chunk_question": from_question + 1}
+
+def advance_question(db, progress: Progress, from_cleared: int, from_question: int) -> bool:
+    # move past question `from_question` of chunk `from_cleared`: on to the next
+    # question in the chunk, or the next chunk after its last question
+    values = question_advance(progress.questions_per_chunk, from_cleared, from_question)
+    while progress.cleared == from_cleared and progress.current_chunk_question == from_question:
+        if compare_and_set(db, progress, **values):
+            return True
+        db.refresh(progress)
+    return False
+
+def advance_boss(db, progress: Progress, from_boss: int, from_question: int, questions: int) -> bool:
+    # move past question `from_question` of boss fight `from_boss`; the boss
+    # is cleared after its last question
+    values = boss_advance(from_boss, from_question, questions)
+    while (progress.bosses_cleared or 0) == from_boss and progress.current_chunk_question == from_question:
+        if compare_and_set(db, progress, **values):
+            return True
+        db.refresh(progress)
+    return False
+
+def count_review(db, progress: Progress, from_reviews: int) -> bool:
+    # a due review was answered between new chunks; concurrent submits count it once
+    while (progress.reviews_since_chunk or 0) == from_reviews:
+        if compare_and_set(db, progress, reviews_since_chunk=from_reviews + 1):
+            return True
+        db.refresh(progress)
+    return False
@@ -0,0 +1,25 @@
+# services/question_pack.py
+"""
+Offline question packs: a document's whole question bank as gzipped JSON
+Lines, so a client can play a session locally and sync its attempts later.
+The first line is a header, then one line per chunk, boss and question.
+"""
+import gzip, hashlib, json
+from typing import Dict, Iterable
+
+PACK_FORMAT = 1  # bump when line shapes change
+
+def pack_id(*parts) -> str:
+    # version of a pack from what it is built of; equal ids mean identical packs
+    return hashlib.sha256(json.dumps([PACK_FORMAT, *parts], default=str).encode("utf-8")).hexdigest()[:32]
+
+def _line(kind: str, fields: Dict) -> str:
+    return json.dumps({"kind": kind, **fields}, separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+
+def write_pack(header: Dict, chunks: Iterable[Dict], bosses: Iterable[Dict], questions: Iterable[Dict]) -> bytes:
+    lines = [_line("pack", {"format": PACK_FORMAT, **header})]
+    lines += [_line("chunk", chunk) for chunk in chunks]
+    lines += [_line("boss", boss) for boss in bosses]
+    lines += [_line("question", question) for question in questions]
+    # mtime=0 keeps the bytes identical for identical content
+    return gzip.compress(("\n".join(lines) + "\n").encode("utf-8"), compresslevel=6, mtime=0)
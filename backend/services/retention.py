@@ -0,0 +1,150 @@
+# services/retention.py
+"""
+Attempt retention. Raw attempts older than ATTEMPT_RETENTION_DAYS are rolled
+into daily per-learner, per-document attempt_rollup rows and deleted in
+bounded batches (optionally archived first as gzipped JSON Lines). Stats read
+both with attempt_stats, so they are unchanged by a rollup.
+"""
+import gzip, json, os, threading, time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import case, delete, func, select, union_all, update
+from sqlalchemy.dialects.sqlite import insert
+from models import Attempt, AttemptKey, AttemptRollup, AwardedTask, Task
+from services import metrics
+
+STAT_FIELDS = ("attempts", "correct", "skipped", "timed", "time_ms")
+
+def attempt_stats(db, user_id: int, doc_id: int) -> Dict[str, int]:
+    # a learner's totals on a document across rollups and recent raw attempts; one
+    # statement, so a rollup batch committing meanwhile is neither missed nor counted twice
+    timed = Attempt.time_ms > 0
+    raw = (select(func.count(Attempt.id).label("attempts"),
+                  func.sum(case((Attempt.correct, 1), else_=0)).label("correct"),
+                  func.sum(case((Attempt.is_skip, 1), else_=0)).label("skipped"),
+                  func.sum(case((timed, 1), else_=0)).label("timed"),
+                  func.sum(case((timed, Attempt.time_ms), else_=0)).label("time_ms"))
+           .join(Task, Task.id == Attempt.task_id)
+           .where(Task.doc_id == doc_id, Attempt.user_id == user_id))
+    rolled = (select(*(func.sum(getattr(AttemptRollup, name)).label(name) for name in STAT_FIELDS))
+              .where(AttemptRollup.user_id == user_id, AttemptRollup.doc_id == doc_id))
+    totals = dict.fromkeys(STAT_FIELDS, 0)
+    for row in db.execute(union_all(raw, rolled)):
+        for name in STAT_FIELDS:
+            totals[name] += row._mapping[name] or 0
+    return totals
+
+def _archive(archive_dir: str, rows):
+    # append to today's archive; gzip members concatenate, so appends stay one valid file
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"attempts-{datetime.utcnow():%Y-%m-%d}.jsonl.gz")
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(dict(row._mapping), default=str, separators=(",", ":")) + "\n")
+
+def roll_up_attempts(db, cutoff: datetime, batch_size: int = 1000, archive_dir: Optional[str] = None) -> Tuple[int, int]:
+    # roll attempts made before `cutoff` into attempt_rollup and delete them, one
+    # transaction per batch; returns (attempts rolled up, rollup rows touched)
+    rolled = touched = 0
+    while True:
+        rows = db.execute(
+            select(Attempt.id, Attempt.user_id, Attempt.task_id, Attempt.answer_json, Attempt.correct,
+                   Attempt.is_skip, Attempt.time_ms, Attempt.confidence, Attempt.created_at, Task.doc_id)
+            .outerjoin(Task, Task.id == Attempt.task_id)
+            .where(Attempt.created_at < cutoff)
+            .order_by(Attempt.created_at)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        db.execute(delete(AttemptKey).where(AttemptKey.attempt_id.in_(ids)).execution_options(synchronize_session=False))
+        # the award stays, so the question still can't score twice
+        db.execute(update(AwardedTask).where(AwardedTask.attempt_id.in_(ids)).values(attempt_id=None)
+                   .execution_options(synchronize_session=False))
+        deleted = db.execute(delete(Attempt).where(Attempt.id.in_(ids)).execution_options(synchronize_session=False))
+        if deleted.rowcount != len(ids):
+            # another worker rolled some of these up first; re-read what is left
+            db.rollback()
+            continue
+
+        days: Dict[tuple, Dict[str, int]] = {}
+        for row in rows:
+            if row.user_id is None or row.doc_id is None:
+                continue  # nobody's stats can read these; archived and dropped
+            day = days.setdefault((row.created_at.date(), row.user_id, row.doc_id), dict.fromkeys(STAT_FIELDS, 0))
+            day["attempts"] += 1
+            day["correct"] += bool(row.correct)
+            day["skipped"] += bool(row.is_skip)
+            if (row.time_ms or 0) > 0:
+                day["timed"] += 1
+                day["time_ms"] += row.time_ms
+        for (day, user_id, doc_id), counts in days.items():
+            db.execute(
+                insert(AttemptRollup)
+                .values(day=day, user_id=user_id, doc_id=doc_id, **counts)
+                .on_conflict_do_update(index_elements=["day", "user_id", "doc_id"],
+                                       set_={name: getattr(AttemptRollup, name) + value for name, value in counts.items()})
+            )
+        if archive_dir:
+            _archive(archive_dir, rows)  # before the commit: a crash can repeat archive lines, never lose them
+        db.commit()
+        rolled += len(rows)
+        touched += len(days)
+        metrics.inc("attempts_rolled_up_total", len(rows))
+        if len(rows) < batch_size:
+            break
+    return rolled, touched
+
+class RetentionWorker:
+    # rolls up aged attempts every interval_seconds in a daemon thread; off when max_age_days is 0
+    def __init__(self, session_factory, max_age_days: float = 0, interval_seconds: float = 86400.0,
+                 batch_size: int = 1000, archive_dir: Optional[str] = None):
+        self._session_factory = session_factory
+        self.max_age_days = max_age_days
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.archive_dir = archive_dir
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, session_factory):
+        return cls(
+            session_factory,
+            max_age_days=float(os.getenv("ATTEMPT_RETENTION_DAYS", "0")),
+            interval_seconds=float(os.getenv("ATTEMPT_RETENTION_INTERVAL_HOURS", "24")) * 3600,
+            batch_size=int(os.getenv("ATTEMPT_RETENTION_BATCH", "1000")),
+            archive_dir=os.getenv("ATTEMPT_ARCHIVE_DIR") or None,
+        )
+
+    def run_once(self) -> int:
+        start = time.perf_counter()
+        db = self._session_factory()
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=self.max_age_days)
+            rolled, touched = roll_up_attempts(db, cutoff, self.batch_size, self.archive_dir)
+        except Exception as e:
+            db.rollback()
+            print(f"Attempt retention failed: {e}")
+            return 0
+        finally:
+            db.close()
+        if rolled:
+            print(f"Rolled {rolled} attempts older than {self.max_age_days:g} days into daily rollups "
+                  f"({touched} row updates) in {time.perf_counter() - start:.1f}s")
+        return rolled
+
+    def start(self):
+        if self.max_age_days <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="attempt-retention", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.run_once()
+            self._stopped.wait(self.interval_seconds)
+
+    def stop(self):
+        self._stopped.set()
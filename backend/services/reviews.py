@@ -0,0 +1,185 @@
+# services/reviews.py
+"""
+SM-2 spaced repetition over missed questions. A wrong or skipped answer
+opens a review item; every later attempt at that question reschedules it.
+Items live in review_item (indexed by learner and due time) and each
+learner's items are mirrored in a min-heap, so the next due review is a
+heap peek instead of a scan over attempts.
+"""
+import heapq, os, threading, time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from models import Attempt, ReviewItem, Task
+
+RELEARN_MINUTES = float(os.getenv("REVIEW_RELEARN_MINUTES", "10"))
+MAX_INTERVAL_DAYS = float(os.getenv("REVIEW_MAX_INTERVAL_DAYS", "365"))
+
+def attempt_quality(correct: bool, is_skip: bool, time_ms: int) -> int:
+    # SM-2 grade 0-5: skips are blackouts, misses are 1, correct answers lose a point per slow tier
+    if is_skip:
+        return 0
+    if not correct:
+        return 1
+    seconds = (time_ms or 0) / 1000.0
+    return 5 if seconds < 10 else 4 if seconds < 30 else 3
+
+def sm2(ease: float, interval_days: float, repetitions: int, quality: int) -> Tuple[float, float, int]:
+    # next (ease, interval_days, repetitions); interval 0 means relearn in RELEARN_MINUTES
+    ease = max(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return ease, 0.0, 0
+    repetitions += 1
+    interval_days = 1.0 if repetitions == 1 else 6.0 if repetitions == 2 else round(interval_days * ease, 1)
+    return ease, min(interval_days, MAX_INTERVAL_DAYS), repetitions
+
+def _due(interval_days: float, now: datetime) -> datetime:
+    interval_days = min(interval_days, MAX_INTERVAL_DAYS)
+    return now + (timedelta(days=interval_days) if interval_days else timedelta(minutes=RELEARN_MINUTES))
+
+def due_review(db, user_id: int, task_id: int, now: Optional[datetime] = None) -> Optional[ReviewItem]:
+    # the learner's item for this question if it is due; an answer to anything else is not a review
+    return (db.query(ReviewItem)
+            .filter(ReviewItem.user_id == user_id, ReviewItem.task_id == task_id,
+                    ReviewItem.due_at <= (now or datetime.utcnow()))
+            .first())
+
+def schedule_review(db, user_id: int, task: Task, attempt: Attempt, now: Optional[datetime] = None) -> Optional[ReviewItem]:
+    # reschedule the learner's item for this question, opening one on a miss; flushes
+    # but leaves the commit to the caller
+    now = now or datetime.utcnow()
+    item = db.query(ReviewItem).filter_by(user_id=user_id, task_id=task.id).first()
+    if item is None:
+        if attempt.correct:
+            return None  # right first time, nothing to review
+        item = ReviewItem(user_id=user_id, doc_id=task.doc_id, task_id=task.id,
+                          ease=2.5, interval_days=0.0, repetitions=0, lapses=0)
+        db.add(item)
+    quality = attempt_quality(attempt.correct, attempt.is_skip, attempt.time_ms)
+    item.ease, item.interval_days, item.repetitions = sm2(item.ease, item.interval_days, item.repetitions, quality)
+    item.lapses += quality < 3
+    item.due_at = _due(item.interval_days, now)
+    item.last_reviewed_at = now
+    db.flush()
+    return item
+
+def record_review(db, user_id: int, task: Task, attempt: Attempt, now: Optional[datetime] = None) -> Optional[ReviewItem]:
+    # schedule_review and commit it
+    try:
+        item = schedule_review(db, user_id, task, attempt, now)
+        if item is not None:
+            db.commit()
+    except IntegrityError:
+        # a concurrent submit opened the item first; its schedule stands
+        db.rollback()
+        return None
+    return item
+
+def backfill_review_items(db, batch_size: int = 1000) -> int:
+    # replay attempt history into review items; only runs while the table is empty
+    if db.query(ReviewItem.id).first() is not None:
+        return 0
+    items: Dict[Tuple[int, int], Dict] = {}
+    rows = (db.query(Attempt.user_id, Attempt.task_id, Attempt.correct, Attempt.is_skip,
+                     Attempt.time_ms, Attempt.created_at, Task.doc_id)
+            .join(Task, Task.id == Attempt.task_id)
+            .filter(Attempt.user_id.isnot(None))
+            .order_by(Attempt.created_at, Attempt.id)
+            .yield_per(batch_size))
+    for r in rows:
+        item = items.get((r.user_id, r.task_id))
+        if item is None:
+            if r.correct:
+                continue
+            item = items[(r.user_id, r.task_id)] = {
+                "user_id": r.user_id, "doc_id": r.doc_id, "task_id": r.task_id,
+                "ease": 2.5, "interval_days": 0.0, "repetitions": 0, "lapses": 0,
+                "created_at": r.created_at,
+            }
+        quality = attempt_quality(r.correct, r.is_skip, r.time_ms)
+        item["ease"], item["interval_days"], item["repetitions"] = sm2(
+            item["ease"], item["interval_days"], item["repetitions"], quality)
+        item["lapses"] += quality < 3
+        item["due_at"] = _due(item["interval_days"], r.created_at)
+        item["last_reviewed_at"] = r.created_at
+    rows = list(items.values())
+    for i in range(0, len(rows), batch_size):
+        db.execute(insert(ReviewItem), rows[i:i + batch_size])
+    db.commit()
+    return len(rows)
+
+class _LearnerHeap:
+    # one learner's due heap; its lock serializes loads and pops for that learner only
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+        self.heap: List[Tuple[datetime, int]] = []
+        self.latest: Dict[int, datetime] = {}
+
+class ReviewQueue:
+    # per-learner min-heaps of (due_at, item_id), loaded from the due-time index on
+    # first use. The table stays the source of truth: an entry whose due time no
+    # longer matches its row is stale and dropped lazily, and heaps are reloaded
+    # every reload_seconds to pick up items written by other worker processes.
+    # The queue's own lock only guards the LRU of heaps; table reads happen under
+    # the learner's lock, so one learner's queries never hold up another's.
+    def __init__(self, max_learners: int = 10000, reload_seconds: float = 300.0):
+        self._heaps: "OrderedDict[Tuple[int, int], _LearnerHeap]" = OrderedDict()
+        self._max_learners = max_learners
+        self._reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+
+    def _entry(self, key) -> _LearnerHeap:
+        with self._lock:
+            entry = self._heaps.get(key)
+            if entry is None:
+                entry = self._heaps[key] = _LearnerHeap()
+            self._heaps.move_to_end(key)
+            while len(self._heaps) > self._max_learners:
+                self._heaps.popitem(last=False)
+            return entry
+
+    def _load(self, db, key, entry: _LearnerHeap):
+        # called with entry.lock held
+        if entry.loaded_at is not None and time.monotonic() - entry.loaded_at < self._reload_seconds:
+            return
+        rows = (db.query(ReviewItem.due_at, ReviewItem.id)
+                .filter(ReviewItem.user_id == key[0], ReviewItem.doc_id == key[1])
+                .order_by(ReviewItem.due_at).all())
+        entry.heap = [(r.due_at, r.id) for r in rows]  # sorted, so already a heap
+        entry.latest = {r.id: r.due_at for r in rows}
+        entry.loaded_at = time.monotonic()
+
+    def push(self, item: ReviewItem):
+        # only heaps already in memory need the update; others load it from the table
+        with self._lock:
+            entry = self._heaps.get((item.user_id, item.doc_id))
+        if entry is None:
+            return
+        with entry.lock:
+            if entry.loaded_at is not None and entry.latest.get(item.id) != item.due_at:
+                heapq.heappush(entry.heap, (item.due_at, item.id))
+                entry.latest[item.id] = item.due_at
+
+    def next_due(self, db, user_id: int, doc_id: int, now: Optional[datetime] = None) -> Optional[ReviewItem]:
+        now = now or datetime.utcnow()
+        key = (user_id, doc_id)
+        entry = self._entry(key)
+        with entry.lock:
+            self._load(db, key, entry)
+            heap, latest = entry.heap, entry.latest
+            while heap and heap[0][0] <= now:
+                due_at, item_id = heap[0]
+                item = db.get(ReviewItem, item_id)
+                if item is not None and item.due_at == due_at:
+                    return item
+                heapq.heappop(heap)
+                if item is not None and latest.get(item_id) != item.due_at:
+                    # rescheduled by another process
+                    heapq.heappush(heap, (item.due_at, item_id))
+                    latest[item_id] = item.due_at
+            return None
+
+review_queue = ReviewQueue()
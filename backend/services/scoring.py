@@ -1,7 +1,11 @@
 # services/scoring.py
-def score_attempt(correct: bool, time_ms: int, combo: int) -> int:
-    base = 10 if correct else 0
-    seconds = max(0, time_ms / 1000.0)
-    speed_bonus = int(max(0, 5 - seconds) * 2)  # cap ~10
+from typing import Optional
+
+def score_attempt(correct: bool, elapsed_ms: Optional[int], combo: int) -> int:
+    # wrong answers score nothing; the speed bonus needs an answer time measured by the
+    # server (see answer_elapsed_ms), never the client's own time_ms
+    if not correct:
+        return 0
+    speed_bonus = int(max(0, 5 - max(0, elapsed_ms) / 1000.0) * 2) if elapsed_ms is not None else 0  # cap ~10
     combo_bonus = combo // 3
-    return base + speed_bonus + combo_bonus
+    return 10 + speed_bonus + combo_bonus
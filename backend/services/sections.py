@@ -0,0 +1,99 @@
+# services/sections.py
+"""
+Section tree and chunk plan over a document's extracted text. Everything is
+kept as character offsets into that text, so planning a 600-page book copies
+no chunk text - chunks are cut and labeled later, as a learner nears them.
+"""
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+# "Chapter 3", "Part II", "2. Title", "4.1 Title", "4.1.2. Title"
+HEADING_RE = re.compile(r"^(?:(chapter|part|section)\s+[\dIVXLC]+\b.*|(\d+(?:\.\d+)*)\.?\s+[A-Z][^.!?]*)$", re.IGNORECASE)
+
+def page_starts(pages: List[str]) -> List[int]:
+    # offset of each page in "\n".join(pages)
+    starts, pos = [], 0
+    for page in pages:
+        starts.append(pos)
+        pos += len(page) + 1
+    return starts
+
+def detect_headings(text: str, max_len: int = 80) -> List[Tuple[int, str, int]]:
+    # (level, title, offset) for short lines that look like numbered headings
+    headings, pos = [], 0
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if 0 < len(stripped) <= max_len:
+            m = HEADING_RE.match(stripped)
+            if m:
+                level = 1 if m.group(1) else m.group(2).count(".") + 1
+                headings.append((level, stripped, pos + line.index(stripped)))
+        pos += len(line) + 1
+    return headings
+
+def outline_headings(outline: List[Tuple[int, str, int]], starts: List[int]) -> List[Tuple[int, str, int]]:
+    # PDF outline entries (level, title, page index) -> (level, title, offset)
+    return [(level, title.strip()[:255], starts[page]) for level, title, page in outline
+            if 0 <= page < len(starts) and title.strip()]
+
+def build_section_tree(text: str, starts: List[int], outline: Optional[List[Tuple[int, str, int]]] = None) -> List[Dict]:
+    # pre-order list of sections; parent is the idx of the enclosing section.
+    # the PDF outline wins, then numbered headings, then one section for everything
+    headings = outline_headings(outline, starts) if outline else []
+    if not headings:
+        headings = detect_headings(text)
+    headings = sorted(headings, key=lambda h: h[2])
+    if not headings or headings[0][2] > 0:
+        headings.insert(0, (1, "Introduction" if headings else "Document", 0))
+
+    sections, stack = [], []
+    for level, title, start in headings:
+        while stack and sections[stack[-1]]["level"] >= level:
+            stack.pop()
+        sections.append({"idx": len(sections), "parent": stack[-1] if stack else None, "level": level,
+                         "title": title, "start": start, "end": len(text)})
+        stack.append(len(sections) - 1)
+
+    # a section ends where the next section at the same or a higher level starts
+    for i, sec in enumerate(sections):
+        for later in sections[i + 1:]:
+            if later["level"] <= sec["level"]:
+                sec["end"] = later["start"]
+                break
+    for sec in sections:
+        sec["page_start"] = max(0, bisect_right(starts, sec["start"]) - 1) + 1
+        sec["page_end"] = max(0, bisect_right(starts, max(sec["start"], sec["end"] - 1)) - 1) + 1
+    return sections
+
+def _cut(text: str, lo: int, hi: int) -> int:
+    # best place to end a chunk inside text[lo:hi]: paragraph, line, sentence, then word break
+    for sep in ("\n\n", "\n", ". ", " "):
+        at = text.rfind(sep, lo, hi)
+        if at != -1:
+            return at + len(sep)
+    return hi
+
+def _split_span(text: str, start: int, end: int, target: int):
+    while end - start > target * 3 // 2:
+        cut = _cut(text, start + target // 2, start + target)
+        yield start, cut
+        start = cut
+    if text[start:end].strip():
+        yield start, end
+
+def plan_chunks(text: str, sections: List[Dict], target_chars: int = 2000, min_chars: int = 400) -> List[Dict]:
+    # chunk spans over the section bodies; a body shorter than min_chars (often
+    # just a heading) is carried into the next one
+    bounds = sorted((sec["start"], sec["idx"]) for sec in sections)
+    chunks, carry = [], None
+    for i, (start, sec_idx) in enumerate(bounds):
+        end = bounds[i + 1][0] if i + 1 < len(bounds) else len(text)
+        if carry is not None:
+            start, carry = carry, None
+        if end - start < min_chars and i + 1 < len(bounds):
+            carry = start
+            continue
+        for a, b in _split_span(text, start, end, target_chars):
+            chunks.append({"idx": len(chunks), "section": sec_idx, "start": a, "end": b})
+    return chunks
@@ -1,9 +1,18 @@
 # services/tasks.py
 import re, random
+from importlib.util import find_spec
 from typing import Dict, List
-from sklearn.feature_extraction.text import TfidfVectorizer
+
+# optional, see requirements.txt; imported on first use since it costs ~1s
+SKLEARN_AVAILABLE = find_spec("sklearn") is not None
+
+CHOICE_OPTIONS = 4  # the answer and three distractors, with or without sklearn
+SWAP_WORD_RE = re.compile(r"\b[a-z]{6,}\b")
 
 def _key_noun_phrases(text: str) -> List[str]:
+    if not SKLEARN_AVAILABLE:
+        return []
+    from sklearn.feature_extraction.text import TfidfVectorizer
     # simple: TF-IDF over sentences to pick keywords; then keep nouns-ish tokens
     sents = re.split(r"(?<=[.!?])\s+", text)
     vect = TfidfVectorizer(stop_words="english", ngram_range=(1,2))
@@ -31,7 +40,7 @@ def make_cloze(text: str) -> Dict:
     k = m.group(1)
     return {"type": "cloze", "prompt": re.sub(rf"\b{k}\b", "_____", text, count=1), "answer": k}
 
-def make_check2(text: str) -> Dict:
+def make_check2(text: str, rng: random.Random = random) -> Dict:
     # true: exact sentence; false: minimal negation or swapped number/quantifier
     sents = re.split(r"(?<=[.!?])\s+", text.strip())
     true = max(sents, key=len) if sents else text
@@ -41,9 +50,60 @@ def make_check2(text: str) -> Dict:
     if false == true:
         false = "It is not true that " + true[:1].lower() + true[1:]
     opts = [true, false]
-    random.shuffle(opts)
+    rng.shuffle(opts)
     return {"type": "check2", "question": "Which statement is correct?", "options": opts, "answer_idx": opts.index(true)}
 
+def _swapped_statements(true: str, text: str, rng: random.Random, n: int) -> List[str]:
+    # up to n false statements: the true one with a word swapped for another word from
+    # the passage with the same ending (so likely the same part of speech), padded with
+    # statements that are false whatever the passage says
+    targets = list(dict.fromkeys(SWAP_WORD_RE.findall(true)))
+    pool = [w for w in dict.fromkeys(SWAP_WORD_RE.findall(text)) if w not in targets]
+    rng.shuffle(targets)
+    rng.shuffle(pool)
+    out = []
+    for t in targets:
+        w = next((w for w in pool if w[-2:] == t[-2:]), None)
+        if w and len(out) < n:
+            pool.remove(w)
+            out.append(re.sub(rf"\b{t}\b", w, true, count=1))
+    for filler in ("It is not true that " + true[:1].lower() + true[1:],
+                   "None of the other statements is correct.", "All of the other statements are correct."):
+        if len(out) < n and filler not in out:
+            out.append(filler)
+    return out
+
+def make_choice(text: str, seed: int = 0, nth: int = 0) -> Dict:
+    # multiple choice built from a cloze sentence, other key phrases as distractors;
+    # falls back to check2 padded to CHOICE_OPTIONS statements. deterministic for a
+    # given seed; nth picks a later key phrase so several questions on one chunk differ
+    rng = random.Random(seed)
+    keys = _key_noun_phrases(text)
+    sents = re.split(r"(?<=[.!?])\s+", text.strip())
+    for k in keys:
+        distractors = [w for w in keys if k not in w and w not in k]
+        sent = next((s for s in sents if re.search(rf"\b{re.escape(k)}\b", s, flags=re.IGNORECASE)), None)
+        if len(distractors) < CHOICE_OPTIONS - 1 or not sent or len(sent) > 300:
+            continue
+        if nth > 0:
+            nth -= 1
+            continue
+        blanked = re.sub(rf"\b{re.escape(k)}\b", "_____", sent, flags=re.IGNORECASE, count=1)
+        opts = [k] + distractors[:CHOICE_OPTIONS - 1]
+        rng.shuffle(opts)
+        return {"type": "choice", "question": f"Which term completes the statement: \"{blanked}\"",
+                "options": opts, "correct": opts.index(k),
+                "explanation": f"The text states: \"{sent}\"",
+                "hint": "Find the sentence in the passage and read it closely."}
+    chk = make_check2(text, rng=rng)
+    true = chk["options"][chk["answer_idx"]]
+    opts = list(chk["options"])
+    opts += [o for o in _swapped_statements(true, text, rng, CHOICE_OPTIONS) if o not in opts][:CHOICE_OPTIONS - len(opts)]
+    rng.shuffle(opts)
+    return {"type": "choice", "question": chk["question"], "options": opts, "correct": opts.index(true),
+            "explanation": f"The text states: \"{true}\"",
+            "hint": "Compare each statement against the exact wording of the passage."}
+
 def make_summary_ref(text: str) -> Dict:
     # naive reference summary = first sentence clipped to ~25 words
     sent = re.split(r"(?<=[.!?])\s+", text.strip())[0] if text.strip() else ""
@@ -0,0 +1,77 @@
+# tests/conftest.py
+"""
+Shared fixtures. db.py opens instance/gamify.db relative to the working
+directory, so the suite runs in a throwaway directory, and without an
+OpenAI key so every question is generated locally.
+"""
+import io, os, sys, tempfile, threading
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BACKEND)
+os.chdir(tempfile.mkdtemp(prefix="hurdle-tests-"))
+os.environ["JWT_SECRET_KEY"] = "test-secret-" + "x" * 32
+os.environ["OPENAI_API_KEY"] = ""
+
+@pytest.fixture(scope="session")
+def app():
+    from app_clean import create_app, shutdown_background_work
+    app = create_app(warm="off")
+    yield app
+    shutdown_background_work()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def upload(client):
+    # upload a PDF (by default a synthetic book long enough to leave chunks to materialize)
+    # and return its document id
+    def _upload(pages=30, seed=7):
+        from benchmarks.synthetic import make_pages, write_pdf
+        data = io.BytesIO()
+        write_pdf(make_pages(pages, seed=seed), data)
+        data.seek(0)
+        response = client.post("/api/upload", data={"file": (data, "book.pdf")},
+                               content_type="multipart/form-data")
+        assert response.status_code == 200, response.json
+        return response.json["pdf_id"]
+    return _upload
+
+@pytest.fixture
+def race():
+    # run work(i) in `count` threads released together; returns what each raised
+    def _race(count, work):
+        barrier = threading.Barrier(count)
+        errors = []
+        def run(i):
+            barrier.wait()
+            try:
+                work(i)
+            except Exception as e:  # pragma: no cover - reported by the caller's assert
+                errors.append(e)
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+    return _race
+
+@pytest.fixture
+def learner(app, upload):
+    # register a learner and open a fresh document, which creates their progress row;
+    # returns (user_id, pdf_id, id of the question served)
+    def _learner(handle, pages=4):
+        pdf_id = upload(pages=pages)
+        client = app.test_client()
+        response = client.post("/api/auth/register", json={
+            "handle": handle, "email": f"{handle}@example.com", "password": "password1"
+        })
+        headers = {"Authorization": f"Bearer {response.json['access_token']}"}
+        hurdle = client.get(f"/api/hurdle/{pdf_id}", headers=headers)
+        assert hurdle.status_code == 200, hurdle.json
+        return response.json["user_id"], pdf_id, hurdle.json["task_id"]
+    return _learner
@@ -0,0 +1,29 @@
+# tests/test_attempt_batch.py
+from datetime import datetime
+
+def test_queued_answer_times_are_clamped(app, learner):
+    from app_clean import MAX_ANSWER_SECONDS, SessionLocal, answer_time_ms
+    from models import Attempt, Progress
+    user_id, pdf_id, task_id = learner("offline")
+    client = app.test_client()
+    token = client.post("/api/auth/login", json={"handle": "offline", "password": "password1"}).json["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    answers = [
+        # answered "in 1970", taking longer than the cap
+        {"key": "a1", "task_id": task_id, "skip": True, "time_ms": 10 ** 12, "answered_at": 0},
+    ]
+    response = client.post(f"/api/hurdle/{pdf_id}/batch", json={"answers": answers}, headers=headers)
+    assert response.status_code == 200, response.json
+    assert [result["status"] for result in response.json["results"]] == ["applied"]
+    
+    db = SessionLocal()
+    try:
+        served_at = db.get(Progress, (user_id, pdf_id)).served_at
+        attempt = db.query(Attempt).filter_by(user_id=user_id, task_id=task_id).one()
+        assert served_at <= attempt.created_at <= datetime.utcnow()
+        assert attempt.time_ms == MAX_ANSWER_SECONDS * 1000
+    finally:
+        SessionLocal.remove()
+    
+    # a negative or unreadable time counts as untimed
+    assert [answer_time_ms(value) for value in (-5, "junk", None, float("nan"), 1500.7)] == [0, 0, 0, 0, 1500]
@@ -0,0 +1,85 @@
+# tests/test_gunicorn.py
+"""
+Boots the production entry point (gunicorn -c gunicorn.conf.py wsgi:app, gevent
+workers) against loadtest.fake_openai and checks the LLM path works in a worker.
+"""
+import io, json, os, socket, subprocess, sys, tempfile, threading, time, urllib.request
+from types import SimpleNamespace
+import pytest
+
+from tests.conftest import BACKEND
+
+pytest.importorskip("gevent")
+pytest.importorskip("gunicorn")
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _call(method, url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status, json.loads(response.read() or b"null")
+
+@pytest.fixture
+def fake_openai():
+    from loadtest.fake_openai import serve
+    server = serve(SimpleNamespace(host="127.0.0.1", port=_free_port(), latency_ms=0, jitter_ms=0,
+                                   error_rate=0.0, rate_limit_share=0.5, verbose=False))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+def _boot(env_extra, workdir):
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=BACKEND, BIND=f"127.0.0.1:{port}", WEB_CONCURRENCY="1",
+               JWT_SECRET_KEY="test-secret-" + "x" * 32, **env_extra)
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", os.path.join(BACKEND, "gunicorn.conf.py"),
+                             "--chdir", workdir, "wsgi:app"], env=env, cwd=workdir,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return proc, f"http://127.0.0.1:{port}"
+
+def _wait_for_health(proc, base_url, seconds=30):
+    deadline = time.time() + seconds
+    while time.time() < deadline and proc.poll() is None:
+        try:
+            if _call("GET", f"{base_url}/health")[0] == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def test_gevent_workers_reach_the_llm(fake_openai):
+    from benchmarks.synthetic import make_pages, write_pdf
+    proc, base_url = _boot({"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": fake_openai}, tempfile.mkdtemp())
+    try:
+        assert _wait_for_health(proc, base_url), proc.stdout.read() if proc.poll() is not None else "timed out"
+        pdf = io.BytesIO()
+        write_pdf(make_pages(5), pdf)
+        boundary = "hurdle-test-boundary"
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"book.pdf\"\r\n"
+                f"Content-Type: application/pdf\r\n\r\n").encode() + pdf.getvalue() + f"\r\n--{boundary}--\r\n".encode()
+        request = urllib.request.Request(f"{base_url}/api/upload", data=body, method="POST",
+                                         headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            pdf_id = json.loads(response.read())["pdf_id"]
+        status, data = _call("POST", f"{base_url}/api/query/{pdf_id}", {"query": "What is the main idea?"})
+        assert status == 200
+        # fake_openai's answer, not the local fallback
+        assert data["answer"].startswith("The document explains this directly")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+def test_worker_refuses_to_boot_without_a_working_client():
+    # a placeholder key is set but builds no client: gunicorn must halt rather than serve
+    proc, base_url = _boot({"OPENAI_API_KEY": "your-openai-api-key-here"}, tempfile.mkdtemp())
+    try:
+        assert proc.wait(timeout=60) != 0
+        assert "OpenAI client failed to initialize" in proc.stdout.read()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
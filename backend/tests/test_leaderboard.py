@@ -0,0 +1,32 @@
+# tests/test_leaderboard.py
+
+def test_concurrent_correct_answers_score_and_extend_the_streak_once(learner, race):
+    from app_clean import SessionLocal
+    from models import AwardedTask, Progress
+    from services.leaderboard import award_attempt
+    user_id, pdf_id, task_id = learner("streaker")
+    points = []
+    
+    def submit(_):
+        db = SessionLocal()
+        try:
+            progress = db.get(Progress, (user_id, pdf_id))
+            points.append(award_attempt(db, progress, task_id, None, True, None))
+        finally:
+            SessionLocal.remove()
+    
+    assert race(8, submit) == []
+    db = SessionLocal()
+    try:
+        progress = db.get(Progress, (user_id, pdf_id))
+        award = db.get(AwardedTask, (user_id, task_id))
+        assert sorted(points) == [0] * 7 + [award.points]
+        assert (progress.xp, progress.streak, progress.best_streak) == (award.points, 1, 1)
+    
+        # answering a question that already scored changes nothing; a wrong answer still ends the streak
+        assert award_attempt(db, progress, task_id, None, True, None) == 0
+        assert (progress.xp, progress.streak) == (award.points, 1)
+        award_attempt(db, progress, task_id, None, False, None)
+        assert (progress.xp, progress.streak, progress.best_streak) == (award.points, 0, 1)
+    finally:
+        SessionLocal.remove()
@@ -0,0 +1,48 @@
+# tests/test_materialize.py
+from sqlalchemy import func
+
+def test_concurrent_materialization_cuts_each_chunk_once(app, upload, race):
+    from app_clean import SessionLocal, materialize_chunks
+    from models import Chunk, ChunkBand, Doc
+    from services.neardup import BANDS
+    pdf_id = upload()
+    db = SessionLocal()
+    pending = db.query(Chunk).filter_by(doc_id=pdf_id, materialized=False).count()
+    SessionLocal.remove()
+    assert pending
+    claimed = []
+    
+    def materialize(_):
+        db = SessionLocal()
+        try:
+            doc = db.get(Doc, pdf_id)
+            chunks = db.query(Chunk).filter_by(doc_id=pdf_id).order_by(Chunk.idx).all()
+            claimed.append(materialize_chunks(db, doc, chunks, 0, len(chunks)))
+        finally:
+            SessionLocal.remove()
+    
+    assert race(8, materialize) == []
+    assert sum(claimed) == pending  # every chunk was cut by exactly one thread
+    db = SessionLocal()
+    try:
+        chunk_ids = [chunk_id for chunk_id, in db.query(Chunk.id).filter_by(doc_id=pdf_id, materialized=True)]
+        assert db.query(Chunk).filter_by(doc_id=pdf_id).count() == len(chunk_ids)
+        bands = dict(db.query(ChunkBand.chunk_id, func.count()).filter(ChunkBand.chunk_id.in_(chunk_ids))
+                     .group_by(ChunkBand.chunk_id))
+        assert set(bands.values()) <= set(range(1, BANDS + 1))
+    finally:
+        SessionLocal.remove()
+
+def test_learners_reaching_the_same_chunk_at_once(app, upload, race):
+    pdf_id = upload()
+    statuses = []
+    
+    def get_hurdle(i):
+        client = app.test_client()
+        token = client.post("/api/auth/register", json={
+            "handle": f"racer{pdf_id}-{i}", "email": f"racer{pdf_id}-{i}@example.com", "password": "password1"
+        }).json["access_token"]
+        statuses.append(client.get(f"/api/hurdle/{pdf_id}", headers={"Authorization": f"Bearer {token}"}).status_code)
+    
+    assert race(12, get_hurdle) == []
+    assert statuses == [200] * 12
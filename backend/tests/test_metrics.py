@@ -0,0 +1,21 @@
+# tests/test_metrics.py
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+def test_failed_statements_leave_no_timing_state_behind():
+    from services import metrics
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    metrics.bind_endpoint("metrics-test")
+    try:
+        with engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.exec_driver_sql("SELECT * FROM missing")
+            conn.exec_driver_sql("SELECT 1")
+            assert conn.info == {}  # nothing pinned on the pooled connection
+    finally:
+        metrics.bind_endpoint(None)
+    hist = metrics._histograms[metrics._key("stage_duration_seconds", {"stage": "db", "endpoint": "metrics-test"})]
+    assert hist[-1] == 1  # only the statement that ran was timed
@@ -0,0 +1,18 @@
+# tests/test_normalize.py
+from services.normalize import normalize_pages
+
+def test_line_break_hyphens_join_words_but_keep_compounds():
+    pages = [
+        "Our real-time system keeps information in one place, within reach.\n"
+        "A well-\nknown infor-\nmation store, with-\nin a real-\ntime budget,\n"
+        "audited by the Anglo-\nSaxon method in the 2019-\n2020 review.",
+    ]
+    cleaned, report = normalize_pages(pages)
+    assert "well-known information store" in cleaned[0]
+    assert "within a real-time budget" in cleaned[0]
+    assert "Anglo-Saxon method in the 2019-2020 review" in cleaned[0]
+    assert report["dehyphenated"] == 2
+
+def test_unknown_fragments_still_join():
+    cleaned, _ = normalize_pages(["The arche-\ntypal pro-\ncessor."])
+    assert cleaned == ["The archetypal processor."]
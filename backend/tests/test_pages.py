@@ -0,0 +1,24 @@
+# tests/test_pages.py
+
+def test_out_of_range_page_is_a_404_even_when_conditional(app, client, upload):
+    from app_clean import PAGE_RENDER_DPI, SessionLocal
+    from models import Doc
+    pdf_id = upload(pages=3)
+    db = SessionLocal()
+    sha256 = db.get(Doc, pdf_id).meta_json["sha256"]
+    SessionLocal.remove()
+    for page, status in ((0, 404), (4, 404), (3, 304)):
+        etag = f"{sha256}-{page}-{PAGE_RENDER_DPI}"
+        response = client.get(f"/api/document/{pdf_id}/page/{page}", headers={"If-None-Match": f'"{etag}"'})
+        assert response.status_code == status, page
+
+def test_disk_lru_overwrite_replaces_the_old_size(tmp_path):
+    from services.pdf_store import DiskLRU
+    cache = DiskLRU(str(tmp_path), max_bytes=1000)
+    cache.put("aa-key", b"x" * 400)
+    for _ in range(5):
+        cache.put("aa-key", b"y" * 400)  # same key rewritten: still one 400-byte entry
+    assert cache._size == 400
+    cache.put("bb-key", b"z" * 400)
+    assert cache.get("aa-key") == b"y" * 400  # nothing was evicted to make room
+    assert cache._size == 800
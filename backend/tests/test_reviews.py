@@ -0,0 +1,51 @@
+# tests/test_reviews.py
+import threading
+from datetime import datetime, timedelta
+
+def test_a_slow_review_read_does_not_hold_up_other_learners(learner):
+    from app_clean import SessionLocal
+    from models import ReviewItem
+    from services.reviews import ReviewQueue
+    queue = ReviewQueue()
+    learners = [learner(f"reviewer{i}") for i in range(2)]
+    db = SessionLocal()
+    due = datetime.utcnow() - timedelta(minutes=1)
+    for user_id, pdf_id, task_id in learners:
+        db.add(ReviewItem(user_id=user_id, doc_id=pdf_id, task_id=task_id, due_at=due))
+    db.commit()
+    SessionLocal.remove()
+    inside, release = threading.Event(), threading.Event()
+    found = {}
+    
+    class SlowSession:
+        # a session whose row reads stall until released
+        def __init__(self, db):
+            self.db = db
+        def get(self, *args):
+            inside.set()
+            release.wait(10)
+            return self.db.get(*args)
+        def __getattr__(self, name):
+            return getattr(self.db, name)
+    
+    def next_due(i, slow=False):
+        user_id, pdf_id, _ = learners[i]
+        db = SessionLocal()
+        try:
+            item = queue.next_due(SlowSession(db) if slow else db, user_id, pdf_id)
+            found[i] = item and item.task_id
+        finally:
+            SessionLocal.remove()
+    
+    stalled = threading.Thread(target=next_due, args=(0, True))
+    stalled.start()
+    assert inside.wait(5)
+    other = threading.Thread(target=next_due, args=(1,))
+    other.start()
+    other.join(5)
+    finished = not other.is_alive()
+    release.set()
+    stalled.join()
+    other.join()
+    assert finished  # the second learner did not wait for the first one's read
+    assert found == {0: learners[0][2], 1: learners[1][2]}
@@ -0,0 +1,15 @@
+# tests/test_tasks.py
+import pytest
+from services import tasks
+
+PASSAGE = ("Photosynthesis converts sunlight into chemical energy inside chloroplasts. "
+           "Plants release oxygen during the process. Temperature increases the reaction rate.")
+
+@pytest.mark.parametrize("text", [PASSAGE, "Cats purr."])
+def test_choice_without_sklearn_has_the_full_option_count(monkeypatch, text):
+    monkeypatch.setattr(tasks, "SKLEARN_AVAILABLE", False)
+    for seed in range(5):
+        question = tasks.make_choice(text, seed=seed)
+        assert len(question["options"]) == len(set(question["options"])) == tasks.CHOICE_OPTIONS
+        assert question["options"][question["correct"]] in text
+        assert question == tasks.make_choice(text, seed=seed)  # deterministic per seed
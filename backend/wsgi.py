@@ -0,0 +1,6 @@
+"""
+WSGI entry point for production servers (see gunicorn.conf.py)
+"""
+from app_clean import create_app
+
+app = create_app()
@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useRef, useState } from "react";
 import "./App.css";
 
 // Components
@@ -53,7 +53,45 @@ function App() {
     correct: boolean;
     explanation: string;
     hint?: string;
+    attemptId?: number;
+    explaining?: boolean;
+    explained?: boolean;
   } | null>(null);
+  const retryTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+
+  // Clear a wrong answer's feedback and let the learner retry after `delayMs`
+  const scheduleRetry = (delayMs: number) => {
+    if (retryTimer.current) clearTimeout(retryTimer.current);
+    retryTimer.current = setTimeout(() => {
+      retryTimer.current = null;
+      setInlineFeedback(null);
+      startTimer(); // Restart timer for retry
+    }, delayMs);
+  };
+
+  // "Why?" on a wrong answer: the personalized explanation is an LLM call, so it
+  // is only fetched when asked for, and the feedback stays up while it is read
+  const handleExplain = async () => {
+    const attemptId = inlineFeedback?.attemptId;
+    if (!attemptId || inlineFeedback?.explaining || inlineFeedback?.explained) return;
+    scheduleRetry(15000);
+    setInlineFeedback((current) => (current ? { ...current, explaining: true } : current));
+    try {
+      const detail = await ApiService.explainAttempt(attemptId);
+      setInlineFeedback((current) =>
+        current?.attemptId === attemptId
+          ? { ...current, explanation: detail.explanation, explaining: false, explained: true }
+          : current
+      );
+    } catch {
+      // Keep the stored explanation
+      setInlineFeedback((current) =>
+        current?.attemptId === attemptId
+          ? { ...current, explaining: false, explained: true }
+          : current
+      );
+    }
+  };
 
   // Handle home screen upload click
   const handleHomeUploadClick = () => {
@@ -122,7 +160,8 @@ function App() {
         gameState.pdfId,
         userAnswer,
         timeMs,
-        false
+        false,
+        gameState.hurdle.task_id
       );
 
       // Set inline feedback for both correct and incorrect answers
@@ -130,6 +169,7 @@ function App() {
         correct: data.correct,
         explanation: data.explanation,
         hint: data.hint,
+        attemptId: data.attempt_id,
       });
 
       // Update progress
@@ -140,11 +180,8 @@ function App() {
       if (!data.correct) {
         // Incorrect answer: stay on same question, show feedback
         stopTimer();
-        // Clear feedback after 5 seconds for incorrect answers
-        setTimeout(() => {
-          setInlineFeedback(null);
-          startTimer(); // Restart timer for retry
-        }, 5000);
+        // Clear feedback after 5 seconds for incorrect answers (longer once "Why?" is asked)
+        scheduleRetry(5000);
         return;
       }
 
@@ -213,7 +250,8 @@ function App() {
         gameState.pdfId,
         null,
         timeMs,
-        true // is_skip = true
+        true, // is_skip = true
+        gameState.hurdle.task_id
       );
 
       // Update progress
@@ -292,6 +330,7 @@ function App() {
                   onSkip={handleSkipQuestion}
                   loading={uiState.loading}
                   feedback={inlineFeedback}
+                  onExplain={handleExplain}
                 />
               )}
             </div>
@@ -16,7 +16,11 @@ interface QuestionCardProps {
     correct: boolean;
     explanation: string;
     hint?: string;
+    attemptId?: number;
+    explaining?: boolean;
+    explained?: boolean;
   } | null;
+  onExplain?: () => void;
 }
 
 export const QuestionCard: React.FC<QuestionCardProps> = ({
@@ -29,6 +33,7 @@ export const QuestionCard: React.FC<QuestionCardProps> = ({
   onSkip,
   loading,
   feedback,
+  onExplain,
 }) => {
   const [selectedOption, setSelectedOption] = useState<number | null>(null);
   const [answer, setAnswer] = useState("");
@@ -163,6 +168,24 @@ export const QuestionCard: React.FC<QuestionCardProps> = ({
             </p>
           </div>
         )}
+        {showFeedback && feedback && !feedback.correct && onExplain && feedback.attemptId && (
+          <div className="avatar-hint">
+            {feedback.explained ? (
+              <p>
+                <strong>Why:</strong> {feedback.explanation}
+              </p>
+            ) : (
+              <button
+                type="button"
+                onClick={onExplain}
+                disabled={feedback.explaining}
+                className="why-btn"
+              >
+                {feedback.explaining ? "Thinking..." : "🤔 Why?"}
+              </button>
+            )}
+          </div>
+        )}
       </div>
 
       <div className="question-meta">
@@ -1,13 +1,86 @@
 // API service functions
 
 const API_BASE_URL = "http://localhost:5002";
+const TOKEN_KEY = "hurdleAuthToken";
+const REFRESH_KEY = "hurdleRefreshToken";
+
+// Requests without a token play as the shared anonymous learner
+const authHeaders = (): Record<string, string> => {
+  const token = localStorage.getItem(TOKEN_KEY);
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
+const saveTokens = (data: { access_token: string; refresh_token?: string }) => {
+  localStorage.setItem(TOKEN_KEY, data.access_token);
+  if (data.refresh_token) localStorage.setItem(REFRESH_KEY, data.refresh_token);
+};
+
+const clearTokens = () => {
+  localStorage.removeItem(TOKEN_KEY);
+  localStorage.removeItem(REFRESH_KEY);
+};
+
+// Trade the refresh token for a new access token; false when there is none or it was refused
+const refreshAccessToken = async () => {
+  const refreshToken = localStorage.getItem(REFRESH_KEY);
+  if (!refreshToken) return false;
+  const response = await fetch(`${API_BASE_URL}/api/auth/refresh`, {
+    method: "POST",
+    headers: { Authorization: `Bearer ${refreshToken}` },
+  });
+  if (!response.ok) return false;
+  saveTokens(await response.json());
+  return true;
+};
+
+// fetch with the learner's token. A 401 (expired or rejected token) is retried once
+// after a refresh; if that fails the tokens are cleared and the request is retried
+// as the anonymous learner instead of failing every call from then on
+const authFetch = async (url: string, init: RequestInit = {}) => {
+  const send = () =>
+    fetch(url, { ...init, headers: { ...(init.headers as Record<string, string>), ...authHeaders() } });
+  const response = await send();
+  if (response.status !== 401 || !localStorage.getItem(TOKEN_KEY)) return response;
+  if (!(await refreshAccessToken())) clearTokens();
+  return send();
+};
 
 export class ApiService {
+  static async register(handle: string, email: string, password: string) {
+    const response = await fetch(`${API_BASE_URL}/api/auth/register`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ handle, email, password }),
+    });
+
+    const data = await response.json();
+    if (data.error) throw new Error(data.error);
+    saveTokens(data);
+    return data;
+  }
+
+  static async login(handle: string, password: string) {
+    const response = await fetch(`${API_BASE_URL}/api/auth/login`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ handle, password }),
+    });
+
+    const data = await response.json();
+    if (data.error) throw new Error(data.error);
+    saveTokens(data);
+    return data;
+  }
+
+  static logout() {
+    clearTokens();
+  }
+
   static async uploadPdf(file: File) {
     const formData = new FormData();
     formData.append("file", file);
     
-    const response = await fetch(`${API_BASE_URL}/api/upload`, {
+    const response = await authFetch(`${API_BASE_URL}/api/upload`, {
       method: "POST",
       body: formData,
     });
@@ -18,7 +91,7 @@ export class ApiService {
   }
 
   static async fetchHurdle(pdfId: string) {
-    const response = await fetch(`${API_BASE_URL}/api/hurdle/${pdfId}`);
+    const response = await authFetch(`${API_BASE_URL}/api/hurdle/${pdfId}`);
     const data = await response.json();
     return data;
   }
@@ -27,15 +100,17 @@ export class ApiService {
     pdfId: string,
     answer: any,
     timeMs: number,
-    isSkip: boolean = false
+    isSkip: boolean = false,
+    taskId?: number
   ) {
-    const response = await fetch(`${API_BASE_URL}/api/hurdle/${pdfId}`, {
+    const response = await authFetch(`${API_BASE_URL}/api/hurdle/${pdfId}`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({
         answer: answer,
         time_ms: timeMs,
         skip: isSkip,
+        task_id: taskId,
       }),
     });
     
@@ -44,8 +119,69 @@ export class ApiService {
     return data;
   }
 
+  // Answers queued while offline, applied in order; `key` makes a retried batch safe
+  static async submitAnswerBatch(
+    pdfId: string,
+    answers: {
+      key: string;
+      task_id: number;
+      answer?: number;
+      skip?: boolean;
+      time_ms: number;
+      answered_at: number;
+    }[]
+  ) {
+    const response = await authFetch(`${API_BASE_URL}/api/hurdle/${pdfId}/batch`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ answers }),
+    });
+    const data = await response.json();
+    if (data.error) throw new Error(data.error);
+    return data;
+  }
+
+  static async explainAttempt(attemptId: number) {
+    const response = await authFetch(`${API_BASE_URL}/api/attempt/${attemptId}/explanation`);
+    const data = await response.json();
+    if (data.error) throw new Error(data.error);
+    return data;
+  }
+
+  static pageImageUrl(pdfId: string, page: number, dpi = 110) {
+    return `${API_BASE_URL}/api/document/${pdfId}/page/${page}?dpi=${dpi}`;
+  }
+
+  // Whole question bank for offline play; resolves to null when `etag` is still current.
+  // The first request for a document starts the build: `building` is true and the
+  // pack is worth asking for again after `retryAfter` seconds.
+  static async getQuestionPack(pdfId: string, etag?: string) {
+    const response = await authFetch(`${API_BASE_URL}/api/document/${pdfId}/pack`, {
+      headers: etag ? { "If-None-Match": etag } : {},
+    });
+    if (response.status === 304) return null;
+    if (response.status === 202) {
+      const retryAfter = Number(response.headers.get("Retry-After")) || 5;
+      return { etag: null, lines: [], building: true, retryAfter };
+    }
+    if (!response.ok) throw new Error(`Question pack failed: ${response.status}`);
+    const lines = (await response.text())
+      .split("\n")
+      .filter(Boolean)
+      .map((line) => JSON.parse(line));
+    return { etag: response.headers.get("ETag"), lines, building: false, retryAfter: 0 };
+  }
+
+  static async getLeaderboard(pdfId?: string, limit = 10) {
+    const path = pdfId ? `/api/leaderboard/${pdfId}` : "/api/leaderboard";
+    const response = await authFetch(`${API_BASE_URL}${path}?limit=${limit}`);
+    const data = await response.json();
+    if (data.error) throw new Error(data.error);
+    return data;
+  }
+
   static async skipQuestion(pdfId: string, timeMs: number) {
-    const response = await fetch(`${API_BASE_URL}/api/hurdle/${pdfId}`, {
+    const response = await authFetch(`${API_BASE_URL}/api/hurdle/${pdfId}`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({
@@ -59,7 +195,7 @@ export class ApiService {
   }
 
   static async queryDocument(pdfId: string, query: string) {
-    const response = await fetch(`${API_BASE_URL}/api/query/${pdfId}`, {
+    const response = await authFetch(`${API_BASE_URL}/api/query/${pdfId}`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({ query: query.trim() }),
@@ -71,13 +207,13 @@ export class ApiService {
   }
 
   static async getPerformance(pdfId: string) {
-    const response = await fetch(`${API_BASE_URL}/api/performance/${pdfId}`);
+    const response = await authFetch(`${API_BASE_URL}/api/performance/${pdfId}`);
     const data = await response.json();
     return data;
   }
 
   static async getCompletionMessage(pdfId: string) {
-    const response = await fetch(`${API_BASE_URL}/api/completion-message/${pdfId}`);
+    const response = await authFetch(`${API_BASE_URL}/api/completion-message/${pdfId}`);
     const data = await response.json();
     return data;
   }
@@ -27,8 +27,12 @@ export interface QuestionProgress {
 export interface Hurdle {
   chunk: string;
   task: Task;
+  task_id?: number;
+  task_source?: string;
   task_type: string;
   is_boss: boolean;
+  is_review?: boolean;
+  page?: number | null;
   idx: number;
   difficulty?: number;
   key_concepts?: string[];
@@ -47,6 +51,9 @@ export interface Feedback {
   score: number;
   explanation: string;
   hint?: string;
+  points?: number;
+  xp?: number;
+  streak?: number;
 }
 
 export interface PerformanceData {